@@ -0,0 +1,35 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark of filter_datum against the original per-field regex loop
+"""
+import re
+import timeit
+from typing import List
+
+filter_datum = __import__('filtered_logger').filter_datum
+PII_FIELDS = __import__('filtered_logger').PII_FIELDS
+
+
+def legacy_filter_datum(fields: List[str], redaction: str, message: str,
+                        separator: str) -> str:
+    """ The original implementation: one fresh regex per field """
+    for field in fields:
+        regex = '(?<=' + field + '=).*?(?=;)'
+        message = re.sub(regex, redaction, message)
+    return message
+
+
+extra = ["field_{}".format(i) for i in range(45)]
+fields = list(PII_FIELDS) + extra
+message = "".join("{}=value-of-{};".format(f, f) for f in fields * 4)
+number = 2000
+
+assert legacy_filter_datum(fields, "***", message, ";") == \
+    filter_datum(fields, "***", message, ";")
+
+for name, func in (("legacy", legacy_filter_datum),
+                   ("filter_datum", filter_datum)):
+    elapsed = timeit.timeit(
+        lambda: func(fields, "***", message, ";"), number=number)
+    print("{:>12}: {:8.2f} us/line ({} fields, {} chars)".format(
+        name, elapsed / number * 1e6, len(fields), len(message)))
@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+Redaction throughput on a synthetic, seeded set of log messages
+
+Usage: python3 -m benchmarks.suite [--size N] [--seed S] [--repeat R]
+       (with the repository root on PYTHONPATH, as benchmark.py runs it)
+Prints a JSON object of {metric: {"value": ..., "unit": ...}}.
+"""
+import argparse
+import json
+import logging
+import random
+from typing import List
+
+from benchmark import throughput
+
+filter_datum = __import__('filtered_logger').filter_datum
+PII_FIELDS = __import__('filtered_logger').PII_FIELDS
+RedactingFormatter = __import__('filtered_logger').RedactingFormatter
+StructuredRedactingFormatter = \
+    __import__('filtered_logger').StructuredRedactingFormatter
+
+FIELDS = list(PII_FIELDS) + ["name", "last_login", "user_agent"]
+
+
+def make_rows(size: int, seed: int) -> List[dict]:
+    """ Returns 'size' synthetic user rows """
+    rng = random.Random(seed)
+    return [{"name": "user{}".format(i),
+             "email": "user{}@example.com".format(i),
+             "phone": "{:010d}".format(rng.randrange(10 ** 10)),
+             "ssn": "{:09d}".format(rng.randrange(10 ** 9)),
+             "password": "{:032x}".format(rng.getrandbits(128)),
+             "ip": "10.{}.{}.{}".format(rng.randrange(256), rng.randrange(256),
+                                        rng.randrange(256)),
+             "last_login": "2019-11-14 06:16:24",
+             "user_agent": "Mozilla/5.0"} for i in range(size)]
+
+
+def run(size: int, seed: int, repeat: int) -> dict:
+    """ Runs every case and returns the results """
+    rows = make_rows(size, seed)
+    messages = ["".join("{}={};".format(k, v) for k, v in row.items())
+                for row in rows]
+    records = [logging.LogRecord("user_data", logging.INFO, __file__, 0,
+                                 message, None, None) for message in messages]
+    structured = [logging.LogRecord("user_data", logging.INFO, __file__, 0,
+                                    "user", None, None) for _ in rows]
+    for record, row in zip(structured, rows):
+        record.data = row
+    text = RedactingFormatter(FIELDS)
+    json_formatter = StructuredRedactingFormatter(FIELDS, output="json")
+    return {
+        "redaction.filter_datum": {
+            "value": throughput(
+                lambda m: filter_datum(FIELDS, "***", m, ";"),
+                messages, repeat),
+            "unit": "messages/s"},
+        "redaction.formatter": {
+            "value": throughput(text.format, records, repeat),
+            "unit": "records/s"},
+        "redaction.structured_json": {
+            "value": throughput(json_formatter.format, structured, repeat),
+            "unit": "records/s"},
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--size", type=int, default=10000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    print(json.dumps(run(args.size, args.seed, args.repeat), indent=2))
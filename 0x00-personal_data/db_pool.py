@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+""" Defines a thread-safe database connection pool """
+import queue
+import threading
+import time
+from typing import Any, Callable, Tuple, Type
+
+
+class PoolTimeout(Exception):
+    """ Raised when no pooled connection frees up in time """
+
+
+class PooledConnection:
+    """ Proxy to a pooled connection whose close() returns it to the pool
+    """
+
+    def __init__(self, pool: "ConnectionPool", connection: Any):
+        self._pool = pool
+        self._connection = connection
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._connection, name)
+
+    def close(self) -> None:
+        """ Hands the connection back to the pool instead of closing it """
+        if self._connection is not None:
+            connection, self._connection = self._connection, None
+            self._pool.release(connection)
+
+    def __enter__(self) -> "PooledConnection":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+class ConnectionPool:
+    """ Keeps up to 'size' open connections made by 'connect'
+
+    Args:
+        connect: a callable that opens a new driver connection
+        size: the maximum number of connections open at once
+        timeout: seconds to wait for a free connection before PoolTimeout
+        retries: how many times a failed connect is retried
+        backoff: seconds before the first retry, doubled on each retry
+        errors: the driver exceptions that trigger a retry
+    """
+
+    def __init__(self, connect: Callable[[], Any], size: int = 5,
+                 timeout: float = 30.0, retries: int = 3,
+                 backoff: float = 0.1,
+                 errors: Tuple[Type[BaseException], ...] = (Exception,)):
+        if size < 1:
+            raise ValueError("Pool size must be at least 1")
+        self._connect = connect
+        self.size = size
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.errors = errors
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._opened = 0
+
+    def acquire(self) -> PooledConnection:
+        """ Checks out a healthy connection, opening one if the pool is not
+        full and waiting for one to be released otherwise
+        """
+        deadline = time.monotonic() + self.timeout
+        while True:
+            try:
+                connection = self._idle.get_nowait()
+            except queue.Empty:
+                connection = None
+            if connection is None and self._reserve():
+                return PooledConnection(self, self._open())
+            if connection is None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise PoolTimeout("No connection free after {}s".format(
+                        self.timeout))
+                try:
+                    connection = self._idle.get(timeout=remaining)
+                except queue.Empty:
+                    continue
+            if self._is_healthy(connection):
+                return PooledConnection(self, connection)
+            self._discard(connection)
+
+    def release(self, connection: Any) -> None:
+        """ Returns a checked out connection to the pool """
+        self._idle.put(connection)
+
+    def close(self) -> None:
+        """ Closes every idle connection """
+        while True:
+            try:
+                self._discard(self._idle.get_nowait())
+            except queue.Empty:
+                return
+
+    def _reserve(self) -> bool:
+        """ Claims a slot for a new connection if the pool is not full """
+        with self._lock:
+            if self._opened >= self.size:
+                return False
+            self._opened += 1
+            return True
+
+    def _open(self) -> Any:
+        """ Opens a connection, retrying with exponential backoff """
+        delay = self.backoff
+        for attempt in range(self.retries + 1):
+            try:
+                return self._connect()
+            except self.errors:
+                if attempt == self.retries:
+                    with self._lock:
+                        self._opened -= 1
+                    raise
+            time.sleep(delay)
+            delay *= 2
+
+    def _discard(self, connection: Any) -> None:
+        """ Closes a connection and frees its slot """
+        with self._lock:
+            self._opened -= 1
+        try:
+            connection.close()
+        except Exception:
+            pass
+
+    @staticmethod
+    def _is_healthy(connection: Any) -> bool:
+        """ Pings the server through the connection """
+        try:
+            if hasattr(connection, "ping"):
+                connection.ping(reconnect=False)
+                return True
+            return connection.is_connected()
+        except Exception:
+            return False
@@ -1,12 +1,22 @@
 #!/usr/bin/env python3
 """ Defines a function hash_password """
 import bcrypt
+from os import getenv
 
 
-def hash_password(password: str) -> bytes:
-    """ Returns a hashed salted byte string password of 'password' """
+BCRYPT_ROUNDS = int(getenv("PERSONAL_DATA_BCRYPT_ROUNDS", "12"))
+
+
+def hash_password(password: str, rounds: int = None) -> bytes:
+    """ Returns a hashed salted byte string password of 'password'
+
+    Args:
+        password: the password to hash
+        rounds: the bcrypt work factor, BCRYPT_ROUNDS when None
+    """
     passwrd = password.encode()
-    hashed = bcrypt.hashpw(passwrd, bcrypt.gensalt())
+    salt = bcrypt.gensalt(rounds or BCRYPT_ROUNDS)
+    hashed = bcrypt.hashpw(passwrd, salt)
     return hashed
 
 
@@ -17,3 +27,14 @@ def is_valid(hashed_password: bytes, password: str) -> bool:
         return True
     else:
         return False
+
+
+def needs_rehash(hashed_password: bytes, rounds: int = None) -> bool:
+    """ Checks whether a hash was made with a different work factor than
+    'rounds' (BCRYPT_ROUNDS when None)
+
+    The work factor for this machine can be picked with the calibration
+    command of the authentication service's hashing module.
+    """
+    cost = int(hashed_password.split(b"$")[2])
+    return cost != (rounds or BCRYPT_ROUNDS)
@@ -1,13 +1,75 @@
 #!/usr/bin/env python3
 """ Defines a function 'filter_datum' """
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import csv
+from db_pool import ConnectionPool, PooledConnection
+from functools import lru_cache
+import itertools
+import json
+import atexit
 import logging
+from logging.handlers import QueueHandler, QueueListener
 import mysql.connector
+import os
 from os import getenv
+import queue
 import re
-from typing import List
+import shutil
+import sys
+import threading
+import time
+from typing import (Any, Callable, Iterable, Iterator, List, Mapping,
+                    Sequence, TextIO, Tuple, Union)
 
 
 PII_FIELDS = ("name", "email", "phone", "ssn", "password")
+COLUMNS = ("name", "email", "phone", "ssn",
+           "password", "ip", "last_login", "user_agent")
+ORDER_BY = "email, name, phone, ssn, password, ip, last_login, user_agent"
+EXPORT_BUFFER_SIZE = 1 << 20
+
+
+class Redactor:
+    """ Precompiled single-pass redactor for a set of fields """
+
+    def __init__(self, fields: Sequence[str], redaction: str,
+                 separator: str):
+        """ Compiles one alternation pattern covering every field
+
+        Args:
+            fields: the field names whose values should be obfuscated
+            redaction: the string substituted for each field value
+            separator: the string separating the fields in a log line
+
+        A ValueError is raised for an empty separator, which would end every
+        value before its first character.
+        """
+        if not separator:
+            raise ValueError("separator must not be empty")
+        self.fields = tuple(fields)
+        self.redaction = redaction
+        self.separator = separator
+        names = "|".join(re.escape(field) for field in self.fields)
+        sep = re.escape(separator)
+        self._pattern = re.compile(
+            r"\b(?P<field>{})=.*?(?={}|$)".format(names, sep), re.MULTILINE)
+        self._replacement = r"\g<field>=" + redaction.replace("\\", r"\\")
+
+    def redact(self, message: str) -> str:
+        """ Returns 'message' with every field value obfuscated """
+        if not self.fields:
+            return message
+        return self._pattern.sub(self._replacement, message)
+
+
+@lru_cache(maxsize=128)
+def get_redactor(fields: Tuple[str, ...], redaction: str,
+                 separator: str) -> Redactor:
+    """ Returns the cached Redactor for a (fields, redaction, separator)
+    combination, compiling it on first use
+    """
+    return Redactor(fields, redaction, separator)
 
 
 def filter_datum(
@@ -24,33 +86,66 @@ def filter_datum(
         separator: a string representing by which character is separating all
             fields in the log line (message)
     """
-    for field in fields:
-        regex = '(?<=' + field + '=).*?(?=;)'
-        message = re.sub(regex, redaction, message)
-    return message
+    return get_redactor(tuple(fields), redaction, separator).redact(message)
+
+
+def get_logger(async_: bool = False, queue_size: int = 10000,
+               overflow: str = "block",
+               sample_every: int = 10,
+               structured: str = None) -> logging.Logger:
+    """ Creates and returns a logging.Logger object
 
+    Args:
+        async_: when True, records are put on a bounded queue and redacted
+            and written by a background worker instead of the calling thread
+        queue_size: the maximum number of records waiting in the queue
+        overflow: what to do when the queue is full, one of 'block',
+            'drop-oldest' or 'sample'
+        sample_every: with the 'sample' policy, one in every 'sample_every'
+            overflowing records is kept, in place of the oldest queued one
+        structured: redact structured records by key and write them as
+            'text' or 'json' lines instead of scanning the formatted text
 
-def get_logger() -> logging.Logger:
-    """ Creates and returns a logging.Logger object """
+    The first call wins: it configures the logger, and later calls return
+    that logger unchanged, ignoring their arguments, rather than adding a
+    handler (and a worker thread) each time. Callers wanting an async or
+    structured logger must therefore make the first call.
+    """
     logger = logging.getLogger("user_data")
+    if logger.handlers:
+        return logger
     logger.setLevel(logging.DEBUG)
     logger.propagate = False
     stream_handler = logging.StreamHandler()
-    stream_handler.setFormatter(RedactingFormatter(PII_FIELDS))
-    logger.addHandler(stream_handler)
+    if structured is None:
+        stream_handler.setFormatter(RedactingFormatter(PII_FIELDS))
+    else:
+        stream_handler.setFormatter(
+            StructuredRedactingFormatter(PII_FIELDS, structured))
+    if not async_:
+        logger.addHandler(stream_handler)
+        return logger
+    records = queue.Queue(maxsize=queue_size)
+    queue_handler = BoundedQueueHandler(records, overflow, sample_every)
+    listener = RedactingQueueListener(records, stream_handler)
+    queue_handler.listener = listener
+    listener.start()
+    atexit.register(listener.stop)
+    logger.addHandler(queue_handler)
     return logger
 
 
+def _connector_variables() -> dict:
+    """ Reads the database credentials from the environment """
+    return {"host": getenv("PERSONAL_DATA_DB_HOST"),
+            "database": getenv("PERSONAL_DATA_DB_NAME"),
+            "username": getenv("PERSONAL_DATA_DB_USERNAME"),
+            "password": getenv("PERSONAL_DATA_DB_PASSWORD")}
+
+
 def get_db() -> mysql.connector.connection.MySQLConnection:
     """ Connects to a MySQL database and returns a connector to the database"""
-    hostname = getenv("PERSONAL_DATA_DB_HOST")
-    db = getenv("PERSONAL_DATA_DB_NAME")
-    usr_name = getenv("PERSONAL_DATA_DB_USERNAME")
-    passwrd = getenv("PERSONAL_DATA_DB_PASSWORD")
-    connector_variables = {"host": hostname,
-                           "database": db,
-                           "username": usr_name,
-                           "password": passwrd}
+    connector_variables = _connector_variables()
     try:
         connection = mysql.connector.connect(**connector_variables)
         return connection
@@ -58,16 +153,298 @@ def get_db() -> mysql.connector.connection.MySQLConnection:
         print("Error: ", e)
 
 
-def main() -> None:
+def _mysql_connect() -> mysql.connector.connection.MySQLConnection:
+    """ Opens a raw connection for the pool """
+    return mysql.connector.connect(**_connector_variables())
+
+
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+
+def get_db_pool(connect: Callable[[], Any] = None) -> ConnectionPool:
+    """ Returns this process's connection pool, creating it on first use
+
+    The pool is sized and tuned by the PERSONAL_DATA_DB_POOL_SIZE,
+    PERSONAL_DATA_DB_POOL_TIMEOUT, PERSONAL_DATA_DB_POOL_RETRIES and
+    PERSONAL_DATA_DB_POOL_BACKOFF environment variables. 'connect' replaces
+    the MySQL driver, e.g. with a local stand-in, when the pool is created.
+    """
+    global _pool, _pool_pid
+    with _pool_lock:
+        if _pool is None or _pool_pid != os.getpid():
+            errors = (Exception,) if connect else (mysql.connector.Error,)
+            _pool = ConnectionPool(
+                connect or _mysql_connect,
+                size=int(getenv("PERSONAL_DATA_DB_POOL_SIZE", "5")),
+                timeout=float(getenv("PERSONAL_DATA_DB_POOL_TIMEOUT", "30")),
+                retries=int(getenv("PERSONAL_DATA_DB_POOL_RETRIES", "3")),
+                backoff=float(getenv("PERSONAL_DATA_DB_POOL_BACKOFF", "0.1")),
+                errors=errors)
+            _pool_pid = os.getpid()
+        return _pool
+
+
+def get_pooled_db() -> PooledConnection:
+    """ Checks a health-checked connection out of the pool
+
+    Unlike get_db, connection errors are raised. Calling close() on the
+    returned connection gives it back to the pool.
+    """
+    return get_db_pool().acquire()
+
+
+def iter_batches(cursor, batch_size: int) -> Iterator[List[tuple]]:
+    """ Yields the rows of an executed cursor 'batch_size' rows at a time """
+    while True:
+        rows = cursor.fetchmany(batch_size)
+        if not rows:
+            return
+        yield rows
+
+
+def export_rows(batches: Iterable[Sequence[tuple]], out: TextIO,
+                fields: Sequence[str] = PII_FIELDS) -> int:
+    """ Writes every row as one redacted log line and returns the row count
+
+    Each batch is rendered into a single chunk of text, redacted with one
+    pass of the compiled redactor and written with a single call, so memory
+    stays bounded by the batch size rather than the table size.
+    """
+    formatter = RedactingFormatter(fields)
+    redactor = get_redactor(tuple(fields), formatter.REDACTION, "; ")
+    line = "[HOLBERTON] user_data INFO {}: {}\n"
+    count = 0
+    for rows in batches:
+        record = logging.LogRecord(
+            "user_data", logging.INFO, None, None, "", None, None)
+        asctime = formatter.formatTime(record)
+        chunk = "".join(
+            line.format(asctime, "; ".join(
+                "{}={}".format(column, value)
+                for column, value in zip(COLUMNS, row)))
+            for row in rows)
+        out.write(redactor.redact(chunk))
+        count += len(rows)
+    return count
+
+
+def iter_csv_batches(csv_path: str, batch_size: int, start: int = None,
+                     end: int = None) -> Iterator[List[list]]:
+    """ Yields the data rows of a CSV dump, skipping its header, 'batch_size'
+    rows at a time
+
+    When 'start' and 'end' are given, only the rows whose line begins at a
+    byte offset in [start, end) are read. Rows must not span several lines.
+    """
+    with open(csv_path, "rb") as f:
+        header_end = len(f.readline())
+        if start is not None and start > header_end:
+            f.seek(start - 1)
+            f.readline()
+        position = f.tell()
+
+        def lines() -> Iterator[str]:
+            nonlocal position
+            for line in f:
+                if end is not None and position >= end:
+                    return
+                position += len(line)
+                yield line.decode()
+        rows = csv.reader(lines())
+        while True:
+            batch = list(itertools.islice(rows, batch_size))
+            if not batch:
+                return
+            yield batch
+
+
+def csv_ranges(csv_path: str, parts: int) -> List[Tuple[int, int]]:
+    """ Splits the data of a CSV dump into 'parts' byte ranges """
+    with open(csv_path, "rb") as f:
+        header_end = len(f.readline())
+    size = os.path.getsize(csv_path) - header_end
+    step = max(1, -(-size // parts))
+    return [(header_end + i * step, header_end + (i + 1) * step)
+            for i in range(parts)]
+
+
+def count_rows(csv_path: str = None) -> int:
+    """ Returns the number of rows in the users table or in a CSV dump """
+    if csv_path is not None:
+        with open(csv_path, newline="") as f:
+            return max(0, sum(1 for _ in csv.reader(f)) - 1)
+    db = get_pooled_db()
+    cursor = db.cursor()
+    try:
+        cursor.execute("SELECT COUNT(*) FROM users;")
+        return cursor.fetchone()[0]
+    finally:
+        cursor.close()
+        db.close()
+
+
+def key_ranges(parts: int) -> List[Tuple[Any, Any]]:
+    """ Splits the users table into at most 'parts' email ranges of about
+    the same size, as (first email, next range's first email) pairs
+
+    None stands for an open end. The first range also holds the rows
+    without an email, and rows sharing an email always share a range.
+
+    The emails are read in a single ordered pass, which an index on
+    users.email serves without sorting.
+    """
+    total = count_rows()
+    step = max(1, -(-total // parts))
+    db = get_pooled_db()
+    cursor = db.cursor(buffered=False)
+    bounds = []
+    try:
+        cursor.execute("SELECT email FROM users WHERE email IS NOT NULL "
+                       "ORDER BY email;")
+        for n, (email,) in enumerate(cursor):
+            if n and n % step == 0 and (not bounds or email != bounds[-1]):
+                bounds.append(email)
+    finally:
+        cursor.close()
+        db.close()
+    edges = [None] + bounds + [None]
+    return list(zip(edges, edges[1:]))
+
+
+def _range_query(start: Any, end: Any) -> Tuple[str, tuple]:
+    """ Returns the SELECT of the users in an email range, ordered so that
+    the shards of a split export are deterministic
+
+    The whole table, with both ends open, is read in storage order instead:
+    sorting it would hold back the first row until every row is sorted.
+    """
+    if start is None and end is None:
+        return "SELECT * FROM users;", ()
+    if start is None:
+        where, params = " WHERE email IS NULL OR email < %s", (end,)
+    elif end is None:
+        where, params = " WHERE email >= %s", (start,)
+    else:
+        where, params = " WHERE email >= %s AND email < %s", (start, end)
+    return "SELECT * FROM users{} ORDER BY {};".format(where, ORDER_BY), \
+        params
+
+
+def export_range(csv_path: str, batch_size: int, output: str = None,
+                 start: Any = None, end: Any = None) -> int:
+    """ Redacts a range of the users table, or of a CSV dump when
+    'csv_path' is given, into 'output' and returns the row count
+
+    For the table, [start, end) is a range of emails and rows come out
+    ordered by email then by every other column, unless the whole table is
+    exported. For a CSV dump it is a
+    range of byte offsets. None leaves that end open. Every call opens its
+    own database connection so it can run in a worker process.
+    """
+    out = sys.stdout if output is None else \
+        open(output, "w", buffering=EXPORT_BUFFER_SIZE)
+    try:
+        if csv_path is not None:
+            return export_rows(
+                iter_csv_batches(csv_path, batch_size, start, end), out)
+        db = get_pooled_db()
+        cursor = db.cursor(buffered=False)
+        try:
+            cursor.execute(*_range_query(start, end))
+            return export_rows(iter_batches(cursor, batch_size), out)
+        finally:
+            cursor.close()
+            db.close()
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+
+def parallel_export(workers: int, output: str, batch_size: int,
+                    csv_path: str = None, merge: bool = True) -> int:
+    """ Splits the rows into one range per worker process and returns the
+    total number of rows exported
+
+    CSV rows are split by byte offset, so no worker parses the rows before
+    its range. Table rows are split by email; without an index on
+    users.email every worker's range query still scans the whole table.
+    Each worker writes its range to the shard '<output>.<n>'. When 'merge'
+    is True the shards are concatenated into 'output' in range order, so it
+    holds the rows of a sequential export, ordered by email.
+    """
+    ranges = csv_ranges(csv_path, workers) if csv_path is not None \
+        else key_ranges(workers)
+    shards = ["{}.{}".format(output, i) for i in range(len(ranges))]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(export_range, csv_path, batch_size, shard,
+                               start, end)
+                   for (start, end), shard in zip(ranges, shards)]
+        count = sum(future.result() for future in futures)
+    if merge:
+        with open(output, "wb") as out:
+            for shard in shards:
+                with open(shard, "rb") as f:
+                    shutil.copyfileobj(f, out, EXPORT_BUFFER_SIZE)
+                os.remove(shard)
+    return count
+
+
+def export_users(batch_size: int = 1000, output: str = None,
+                 csv_path: str = None, workers: int = 1,
+                 merge: bool = True) -> None:
+    """ Streams the users table through the redactor in batches
+
+    Args:
+        batch_size: the number of rows fetched and redacted at a time
+        output: the file to write to, standard output when None
+        csv_path: read this CSV dump instead of the users table
+        workers: the number of processes sharing the rows
+        merge: whether to merge the per-worker shards into 'output'
+    """
+    start = time.perf_counter()
+    if workers > 1:
+        count = parallel_export(workers, output, batch_size, csv_path, merge)
+    else:
+        count = export_range(csv_path, batch_size, output)
+    elapsed = time.perf_counter() - start
+    print("{} rows in {:.2f}s ({:.0f} rows/sec)".format(
+        count, elapsed, count / elapsed if elapsed else 0), file=sys.stderr)
+
+
+def main(argv: List[str] = None) -> None:
     """ Script main function """
-    columns = ["name", "email", "phone", "ssn",
-               "password", "ip", "last_login", "user_agent"]
+    parser = argparse.ArgumentParser(
+        description="Log the users table with PII fields redacted")
+    parser.add_argument("--stream", action="store_true",
+                        help="stream the table in batches instead of "
+                             "logging one record per row")
+    parser.add_argument("--batch-size", type=int, default=1000,
+                        help="rows fetched per batch in streaming mode")
+    parser.add_argument("--output", default=None,
+                        help="output file in streaming mode "
+                             "(default: standard output)")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="processes sharing the rows in streaming mode")
+    parser.add_argument("--no-merge", dest="merge", action="store_false",
+                        help="keep one output shard per worker")
+    parser.add_argument("--csv", dest="csv_path", default=None,
+                        help="read this CSV dump instead of the database")
+    args = parser.parse_args(argv)
+    if args.workers > 1 and args.output is None:
+        parser.error("--workers requires --output")
+    if args.stream or args.csv_path is not None:
+        export_users(args.batch_size, args.output, args.csv_path,
+                     args.workers, args.merge)
+        return
+
     db = get_db()
     cursor = db.cursor()
     cursor.execute("SELECT * FROM users;")
     logger = get_logger()
     for row in cursor:
-        series = map(lambda x: "{}={}".format(x[0], x[1]), zip(columns, row))
+        series = map(lambda x: "{}={}".format(x[0], x[1]), zip(COLUMNS, row))
         log_message = "{}".format("; ".join(list(series)))
         log_record = logging.LogRecord(
             "user_data", logging.INFO, None, None, log_message, None, None)
@@ -87,14 +464,147 @@ class RedactingFormatter(logging.Formatter):
     def __init__(self, fields: List[str]):
         super(RedactingFormatter, self).__init__(self.FORMAT)
         self.fields = fields
+        self._redactor = get_redactor(tuple(fields), self.REDACTION,
+                                      self.SEPARATOR)
 
     def format(self, record: logging.LogRecord) -> str:
         """ Formats the log record """
         formatted_record = super(RedactingFormatter, self).format(record)
-        logged_record = filter_datum(self.fields, self.REDACTION,
-                                     formatted_record,
-                                     self.SEPARATOR)
-        return logged_record
+        return self._redactor.redact(formatted_record)
+
+
+class StructuredRedactingFormatter(RedactingFormatter):
+    """ Redacts structured records by key before they are serialized
+
+    The fields come from 'extra={"data": {...}}' or from a single mapping
+    passed as the record's arguments. The message text is still scanned by
+    the regex redaction of RedactingFormatter, which also handles records
+    without fields.
+    """
+
+    OUTPUT_FORMATS = ("text", "json")
+
+    def __init__(self, fields: List[str], output: str = "text"):
+        if output not in self.OUTPUT_FORMATS:
+            raise ValueError("Unknown output format {}".format(output))
+        super(StructuredRedactingFormatter, self).__init__(fields)
+        self.output = output
+        self._field_set = frozenset(fields)
+
+    @staticmethod
+    def _data(record: logging.LogRecord) -> Union[Mapping, None]:
+        """ Returns the structured fields carried by the record, if any """
+        data = getattr(record, "data", None)
+        if isinstance(data, Mapping):
+            return data
+        if isinstance(record.args, Mapping):
+            return record.args
+        return None
+
+    def redact(self, data: Mapping) -> dict:
+        """ Returns a copy of 'data' with the PII values replaced """
+        return {key: self.REDACTION if key in self._field_set else value
+                for key, value in data.items()}
+
+    def _trace(self, record: logging.LogRecord) -> str:
+        """ Returns the redacted traceback and stack of the record, which
+        logging.Formatter.format would append to the message
+        """
+        parts = []
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            parts.append(record.exc_text)
+        if record.stack_info:
+            parts.append(self.formatStack(record.stack_info))
+        return self._redactor.redact("\n".join(parts))
+
+    def format(self, record: logging.LogRecord) -> str:
+        """ Formats the log record """
+        data = self._data(record)
+        if data is None:
+            return super(StructuredRedactingFormatter, self).format(record)
+        redacted = self.redact(data)
+        record.asctime = self.formatTime(record)
+        text = self._redactor.redact(str(record.msg)) if record.msg else ""
+        trace = self._trace(record)
+        if self.output == "json":
+            line = {"time": record.asctime,
+                    "name": record.name,
+                    "level": record.levelname,
+                    "message": text,
+                    "fields": redacted}
+            if trace:
+                line["exc_info"] = trace
+            return json.dumps(line, default=str)
+        pairs = "".join("{}={}{}".format(key, value, self.SEPARATOR)
+                        for key, value in redacted.items())
+        record.message = "{} {}".format(text, pairs) if text else pairs
+        line = self.formatMessage(record)
+        return "{}\n{}".format(line, trace) if trace else line
+
+
+class BoundedQueueHandler(QueueHandler):
+    """ Queue handler that hands records to a background worker without
+    formatting them, applying an overflow policy when the queue is full
+    """
+
+    OVERFLOW_POLICIES = ("block", "drop-oldest", "sample")
+
+    def __init__(self, records: queue.Queue, overflow: str = "block",
+                 sample_every: int = 10):
+        if overflow not in self.OVERFLOW_POLICIES:
+            raise ValueError("Unknown overflow policy {}".format(overflow))
+        super(BoundedQueueHandler, self).__init__(records)
+        self.overflow = overflow
+        self.sample_every = max(1, sample_every)
+        self.dropped = 0
+        self._overflowed = 0
+        self.listener = None
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        """ Leaves formatting and redaction to the worker thread """
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        """ Puts the record on the queue according to the overflow policy """
+        if self.overflow == "block":
+            self.queue.put(record)
+            return
+        try:
+            self.queue.put_nowait(record)
+            return
+        except queue.Full:
+            pass
+        if self.overflow == "sample":
+            self._overflowed += 1
+            if self._overflowed % self.sample_every:
+                self.dropped += 1
+                return
+        while True:
+            try:
+                self.queue.get_nowait()
+                self.dropped += 1
+            except queue.Empty:
+                pass
+            try:
+                self.queue.put_nowait(record)
+                return
+            except queue.Full:
+                continue
+
+
+class RedactingQueueListener(QueueListener):
+    """ Background worker that redacts and writes queued records """
+
+    def enqueue_sentinel(self) -> None:
+        """ Waits for room in a full queue so that stop() always drains it """
+        self.queue.put(self._sentinel)
+
+    def stop(self) -> None:
+        """ Flushes every queued record and stops the worker, once """
+        if self._thread is not None:
+            super(RedactingQueueListener, self).stop()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,42 @@
+#!/usr/bin/env python3
+"""
+Main file
+"""
+
+ConnectionPool = __import__('db_pool').ConnectionPool
+
+
+class StandInConnection:
+    """ Local stand-in for a driver connection """
+    opened = []
+
+    def __init__(self):
+        StandInConnection.opened.append(self)
+        self.alive = True
+
+    def ping(self, reconnect=False):
+        if not self.alive:
+            raise ConnectionError("gone")
+
+    def close(self):
+        self.alive = False
+
+
+failures = [ConnectionError("refused")]
+
+
+def connect():
+    if failures:
+        raise failures.pop()
+    return StandInConnection()
+
+
+pool = ConnectionPool(connect, size=2, retries=1, backoff=0.01)
+db = pool.acquire()
+db.close()
+db = pool.acquire()
+print(len(StandInConnection.opened))
+StandInConnection.opened[0].alive = False
+db.close()
+db = pool.acquire()
+print(len(StandInConnection.opened))
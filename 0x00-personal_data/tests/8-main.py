@@ -0,0 +1,33 @@
+#!/usr/bin/env python3
+"""
+Main file
+"""
+
+filter_datum = __import__('filtered_logger').filter_datum
+Redactor = __import__('filtered_logger').Redactor
+
+fields = ["password", "date_of_birth"]
+messages = ["name=egg;email=eggmin@eggsample.com;password=eggcellent;"
+            "date_of_birth=12/12/1986;",
+            "name=bob;email=bob@dylan.com;password=bobbycool;"
+            "date_of_birth=03/04/1993;"]
+for message in messages:
+    print(filter_datum(fields, 'xxx', message, ';'))
+
+# Another separator, and a last field with no separator after it
+print(filter_datum(fields, 'xxx', "password=a|b|date_of_birth=1/1/1", '|'))
+
+# Field names only match as whole words
+print(filter_datum(["name"], '***', "name=bob;username=bob;", ';'))
+print(filter_datum(["email"], '***', "x_email=a;email=b;", ';'))
+
+# The redaction is inserted literally
+print(filter_datum(["ssn"], r'\1\g<0>', "ssn=123;", ';'))
+
+print(Redactor([], 'xxx', ';').redact("password=kept;"))
+
+# An empty separator cannot delimit a value
+try:
+    filter_datum(["a"], 'X', "a=1;b=2;", '')
+except ValueError as e:
+    print(e)
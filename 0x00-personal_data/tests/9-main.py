@@ -0,0 +1,26 @@
+#!/usr/bin/env python3
+"""
+Main file
+"""
+import json
+import logging
+import sys
+
+StructuredRedactingFormatter = \
+    __import__('filtered_logger').StructuredRedactingFormatter
+
+for output in ("text", "json"):
+    handler = logging.StreamHandler(sys.stdout)
+    handler.setFormatter(StructuredRedactingFormatter(["password"], output))
+    logger = logging.getLogger("structured_" + output)
+    logger.propagate = False
+    logger.addHandler(handler)
+    try:
+        raise RuntimeError("password=hunter2;")
+    except RuntimeError:
+        logger.exception("failed", extra={"data": {"user": "bob",
+                                                   "password": "hunter2"}})
+
+line = json.loads(StructuredRedactingFormatter(["password"], "json").format(
+    logging.makeLogRecord({"msg": "ok", "data": {"password": "x"}})))
+print("exc_info" in line)
@@ -0,0 +1,31 @@
+#!/usr/bin/env python3
+""" Module of the API authentication
+"""
+from flask import request
+from typing import List, TypeVar
+
+
+class Auth():
+    """ Base class of the API authentication
+    """
+
+    def require_auth(self, path: str, excluded_paths: List[str]) -> bool:
+        """ Whether 'path' needs authentication, trailing slashes ignored
+        """
+        if path is None or not excluded_paths:
+            return True
+        path = path.rstrip('/') + '/'
+        return all(path != excluded.rstrip('/') + '/'
+                   for excluded in excluded_paths)
+
+    def authorization_header(self, request=None) -> str:
+        """ Return the Authorization header of a request
+        """
+        if request is None:
+            return None
+        return request.headers.get('Authorization')
+
+    def current_user(self, request=None) -> TypeVar('User'):
+        """ Return the authenticated User of a request
+        """
+        return None
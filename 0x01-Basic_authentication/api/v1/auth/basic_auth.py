@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+""" Module of the Basic authentication
+"""
+from api.v1.auth.auth import Auth
+import base64
+import binascii
+from collections import OrderedDict
+import hashlib
+from models.user import User
+from os import getenv
+import threading
+import time
+from typing import Tuple, TypeVar
+
+
+class BasicAuth(Auth):
+    """ Basic authentication with a cache of verified credentials
+
+    A verified Authorization header is remembered, under its SHA-256
+    digest, as the User ID, email and password hash it matched. For
+    'cache_ttl' seconds a repeated header is then resolved by ID, with
+    no email search and no password hashing. An entry stops matching as
+    soon as the User's email or password changes.
+    """
+
+    def __init__(self, cache_size: int = None, cache_ttl: float = None):
+        self.cache_size = cache_size if cache_size is not None else \
+            int(getenv("BASIC_AUTH_CACHE_SIZE", "10000"))
+        self.cache_ttl = cache_ttl if cache_ttl is not None else \
+            float(getenv("BASIC_AUTH_CACHE_TTL", "300"))
+        self._verified = OrderedDict()
+        self._lock = threading.Lock()
+
+    def extract_credentials(self, header: str) -> Tuple[str, str]:
+        """ Return the (email, password) of a Basic Authorization header,
+        or (None, None) if the header is malformed
+        """
+        if type(header) is not str or not header.startswith('Basic '):
+            return None, None
+        try:
+            decoded = base64.b64decode(header[6:], validate=True)
+            decoded = decoded.decode('utf-8')
+        except (binascii.Error, UnicodeDecodeError):
+            return None, None
+        if ':' not in decoded:
+            return None, None
+        email, password = decoded.split(':', 1)
+        return email, password
+
+    def user_object_from_credentials(self, email: str,
+                                     password: str) -> TypeVar('User'):
+        """ Return the User with this email and password, found through
+        the email index
+        """
+        if type(email) is not str or type(password) is not str:
+            return None
+        for user in User.search({'email': email}):
+            if user.is_valid_password(password):
+                return user
+        return None
+
+    def current_user(self, request=None) -> TypeVar('User'):
+        """ Return the authenticated User of a request
+        """
+        header = self.authorization_header(request)
+        if header is None:
+            return None
+        key = hashlib.sha256(header.encode()).digest()
+        user = self._cached_user(key)
+        if user is not None:
+            return user
+        user = self.user_object_from_credentials(
+            *self.extract_credentials(header))
+        if user is not None and self.cache_size > 0:
+            with self._lock:
+                self._verified[key] = (user.id, user.email, user.password,
+                                       time.monotonic() + self.cache_ttl)
+                self._verified.move_to_end(key)
+                while len(self._verified) > self.cache_size:
+                    self._verified.popitem(last=False)
+        return user
+
+    def invalidate(self, user_id: str = None):
+        """ Forget the verified credentials of a User, or of every User
+        """
+        with self._lock:
+            if user_id is None:
+                self._verified.clear()
+                return
+            for key, entry in list(self._verified.items()):
+                if entry[0] == user_id:
+                    del self._verified[key]
+
+    def _cached_user(self, key: bytes) -> TypeVar('User'):
+        """ Return the User of a fresh cache entry that still matches
+        """
+        with self._lock:
+            entry = self._verified.get(key)
+            if entry is None:
+                return None
+            if entry[3] > time.monotonic():
+                self._verified.move_to_end(key)
+            else:
+                del self._verified[key]
+                return None
+        user = User.get(entry[0])
+        if user is None or user.email != entry[1] or \
+                user.password != entry[2]:
+            with self._lock:
+                self._verified.pop(key, None)
+            return None
+        return user
@@ -1,8 +1,16 @@
 #!/usr/bin/env python3
 """ Module of Index views
 """
-from flask import jsonify, abort
+from flask import jsonify, abort, current_app, request
 from api.v1.views import app_views
+from models.user import User
+from os import getenv
+import hashlib
+import time
+
+
+STATS_TTL = float(getenv("STATS_TTL", "1"))
+_stats_cache = {}
 
 
 @app_views.route('/status', methods=['GET'], strict_slashes=False)
@@ -18,9 +26,21 @@ def status() -> str:
 def stats() -> str:
     """ GET /api/v1/stats
     Return:
-      - the number of each objects
+      - the number of each objects and of users created in the last day
+      - 304 if the If-None-Match header matches the current ETag
+    The response is cached for STATS_TTL seconds.
     """
-    from models.user import User
-    stats = {}
-    stats['users'] = User.count()
-    return jsonify(stats)
+    now = time.monotonic()
+    cached = _stats_cache.get('stats')
+    if cached is None or cached[0] <= now:
+        stats = {}
+        stats['users'] = User.count()
+        stats['users_last_day'] = User.count_recent()
+        body = jsonify(stats).get_data()
+        cached = (now + STATS_TTL, body, hashlib.sha1(body).hexdigest())
+        _stats_cache['stats'] = cached
+    response = current_app.response_class(cached[1],
+                                          mimetype='application/json')
+    response.set_etag(cached[2])
+    response.cache_control.max_age = int(STATS_TTL)
+    return response.make_conditional(request)
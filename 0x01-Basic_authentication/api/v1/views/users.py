@@ -2,18 +2,84 @@
 """ Module of Users views
 """
 from api.v1.views import app_views
-from flask import abort, jsonify, request
+from flask import (abort, json as flask_json, jsonify, request, Response,
+                   stream_with_context, url_for)
 from models.user import User
+from typing import Iterable, Iterator
+import json
+
+
+MAX_PAGE_SIZE = 1000
+
+
+def _projection(fields: str = None):
+    """ Return a function rendering a user with only the 'fields' asked for,
+    reading no other attribute
+    """
+    if not fields:
+        return lambda user: user.to_json()
+    keys = [key for key in fields.split(',') if key]
+
+    def project(user: User) -> dict:
+        data = user.to_json(keys=keys)
+        return {key: data[key] for key in keys if key in data}
+    return project
+
+
+def _stream_json_array(items: Iterable, render) -> Iterator[str]:
+    """ Yield a JSON array one element at a time
+    """
+    dumps = flask_json.dumps
+    yield '['
+    for i, item in enumerate(items):
+        yield (',' if i else '') + dumps(render(item))
+    yield ']'
 
 
 @app_views.route('/users', methods=['GET'], strict_slashes=False)
 def view_all_users() -> str:
     """ GET /api/v1/users
+    Query parameters (optional):
+      - limit: page size, up to MAX_PAGE_SIZE
+      - cursor: ID of the last User of the previous page
+      - fields: comma separated attributes to return for each User
+      - stream: 1 to stream the JSON array in chunks
     Return:
       - list of all User objects JSON represented
+      - with limit or cursor: {"users": [...], "next": URL of the next page
+        or null}, Users ordered by ID
+      - 400 if limit is not a positive integer
     """
-    all_users = [user.to_json() for user in User.all()]
-    return jsonify(all_users)
+    render = _projection(request.args.get('fields'))
+    limit = request.args.get('limit')
+    cursor = request.args.get('cursor')
+    next_url = None
+    if limit is None and cursor is None:
+        users = User.all()
+    else:
+        try:
+            limit = min(int(limit or MAX_PAGE_SIZE), MAX_PAGE_SIZE)
+        except ValueError:
+            limit = 0
+        if limit < 1:
+            return jsonify({'error': "limit must be a positive integer"}), 400
+        users = User.page(cursor, limit + 1)
+        if len(users) > limit:
+            users = users[:limit]
+            args = request.args.to_dict()
+            args.update(cursor=users[-1].id, limit=limit)
+            next_url = url_for('app_views.view_all_users', **args)
+
+    if request.args.get('stream') == '1':
+        response = Response(stream_with_context(
+            _stream_json_array(users, render)), mimetype='application/json')
+        if next_url is not None:
+            response.headers['Link'] = '<{}>; rel="next"'.format(next_url)
+        return response
+    if limit is None and cursor is None:
+        return jsonify([render(user) for user in users])
+    return jsonify({'users': [render(user) for user in users],
+                    'next': next_url})
 
 
 @app_views.route('/users/<user_id>', methods=['GET'], strict_slashes=False)
@@ -89,6 +155,67 @@ def create_user() -> str:
     return jsonify({'error': error_msg}), 400
 
 
+@app_views.route('/users/bulk', methods=['POST'], strict_slashes=False)
+def create_users() -> str:
+    """ POST /api/v1/users/bulk
+    Body: a JSON array of users, or one JSON user per line when the
+    Content-Type is application/x-ndjson. Each user has:
+      - email
+      - password
+      - last_name (optional)
+      - first_name (optional)
+    Return:
+      - the number of User objects created, all saved with a single write
+      - 400 with the index of the first invalid user; nothing is saved
+    """
+    if request.mimetype == 'application/x-ndjson':
+        rows = (json.loads(line) for line in request.stream if line.strip())
+    else:
+        rows = request.get_json(silent=True)
+        if type(rows) is not list:
+            return jsonify({'error': "Wrong format"}), 400
+    users = []
+    error_msg = None
+    try:
+        for rj in rows:
+            if type(rj) is not dict:
+                error_msg = "Wrong format"
+            elif rj.get("email", "") == "":
+                error_msg = "email missing"
+            elif rj.get("password", "") == "":
+                error_msg = "password missing"
+            if error_msg is not None:
+                break
+            user = User()
+            user.email = rj.get("email")
+            user.password = rj.get("password")
+            user.first_name = rj.get("first_name")
+            user.last_name = rj.get("last_name")
+            users.append(user)
+    except ValueError:
+        error_msg = "Wrong format"
+    if error_msg is not None:
+        return jsonify({'error': error_msg, 'index': len(users)}), 400
+    try:
+        User.save_many(users)
+    except Exception as e:
+        return jsonify({'error': "Can't create Users: {}".format(e)}), 400
+    return jsonify({'created': len(users)}), 201
+
+
+@app_views.route('/users/bulk', methods=['GET'], strict_slashes=False)
+def export_users() -> str:
+    """ GET /api/v1/users/bulk
+    Return:
+      - all User objects JSON represented, streamed one per line (NDJSON)
+    """
+    dumps = flask_json.dumps
+    users = User.all()
+    return Response(stream_with_context(
+        dumps(user.to_json()) + '\n' for user in users),
+        mimetype='application/x-ndjson')
+
+
 @app_views.route('/users/<user_id>', methods=['PUT'], strict_slashes=False)
 def update_user(user_id: str = None) -> str:
     """ PUT /api/v1/users/:id
@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+"""
+Requests per second of a Basic-authenticated endpoint, with and without
+the verified credentials cache
+
+Usage: python3 -m benchmarks.basic_auth [USERS]  (default: 100000)
+"""
+import base64
+import os
+import sys
+import tempfile
+import time
+
+os.environ["AUTH_TYPE"] = "basic_auth"
+root = os.getcwd()
+os.chdir(tempfile.mkdtemp())
+from api.v1 import app as app_module  # noqa: E402
+from models.base import DATA  # noqa: E402
+from models.user import User  # noqa: E402
+
+count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+for i in range(count):
+    user = User(email="user{}@example.com".format(i))
+    user.password = "password{}".format(i)
+    DATA['User'][user.id] = user
+    user._index()
+target = User.search({'email': "user{}@example.com".format(count // 2)})[0]
+credentials = "{}:password{}".format(target.email, count // 2)
+headers = {'Authorization': "Basic {}".format(
+    base64.b64encode(credentials.encode()).decode())}
+path = '/api/v1/users/{}'.format(target.id)
+client = app_module.app.test_client()
+
+for label, size in (("no cache", 0), ("cache", 10000)):
+    app_module.auth.cache_size = size
+    app_module.auth.invalidate()
+    requests = 2000
+    start = time.perf_counter()
+    for _ in range(requests):
+        assert client.get(path, headers=headers).status_code == 200
+    elapsed = time.perf_counter() - start
+    print("{:>8}: {:7.0f} requests/sec at {} users".format(
+        label, requests / elapsed, count))
+os.chdir(root)
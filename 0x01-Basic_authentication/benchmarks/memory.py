@@ -0,0 +1,42 @@
+#!/usr/bin/env python3
+"""
+Memory per resident User, compact slots vs the former __dict__ layout
+
+Usage: python3 -m benchmarks.memory [COUNT]  (default: 100000)
+"""
+import sys
+import tracemalloc
+import uuid
+from datetime import datetime
+
+from models.user import User
+
+
+class LegacyUser():
+    """ The former layout: a __dict__ per object and datetime attributes """
+
+    def __init__(self, email: str):
+        self.id = str(uuid.uuid4())
+        self.created_at = datetime.utcnow()
+        self.updated_at = datetime.utcnow()
+        self.email = email
+        self._password = None
+        self.first_name = None
+        self.last_name = None
+
+
+def measure(cls, count: int) -> float:
+    """ Returns the bytes allocated per object for 'count' objects """
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    objs = [cls(email="user{}@example.com".format(i)) for i in range(count)]
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del objs
+    return (after - before) / count
+
+
+count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+for cls in (LegacyUser, User):
+    print("{:>10}: {:6.0f} bytes/object".format(
+        cls.__name__, measure(cls, count)))
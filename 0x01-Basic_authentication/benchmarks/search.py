@@ -0,0 +1,33 @@
+#!/usr/bin/env python3
+"""
+Email search latency with and without the secondary index
+
+Usage: python3 -m benchmarks.search [SIZE ...]  (default: 10000 100000 1000000)
+"""
+import sys
+import timeit
+
+from models.base import DATA
+from models.user import User
+
+
+def linear_search(attributes: dict) -> list:
+    """ The original full scan over every stored object """
+    return [obj for obj in DATA['User'].values()
+            if all(getattr(obj, k) == v for k, v in attributes.items())]
+
+
+sizes = [int(n) for n in sys.argv[1:]] or [10000, 100000, 1000000]
+DATA['User'] = {}
+for size in sizes:
+    while len(DATA['User']) < size:
+        user = User(email="user{}@example.com".format(len(DATA['User'])))
+        DATA['User'][user.id] = user
+        user._index()
+    query = {'email': "user{}@example.com".format(size // 2)}
+    assert User.search(query) == linear_search(query)
+    number = 1000 if size <= 100000 else 200
+    indexed = timeit.timeit(lambda: User.search(query), number=number)
+    scan = timeit.timeit(lambda: linear_search(query), number=10)
+    print("{:>9} users: indexed {:9.2f} us/search, scan {:11.2f} us/search"
+          .format(size, indexed / number * 1e6, scan / 10 * 1e6))
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Cold start time and peak memory of User.load_from_file
+
+Usage: python3 -m benchmarks.startup [SIZE]  (default: 1000000)
+"""
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime
+
+MODES = ("legacy", "streaming", "lazy")
+
+
+def legacy_load(cls) -> dict:
+    """ The original loader: json.load and two strptime calls per user """
+    from models.base import TIMESTAMP_FORMAT
+    objs = {}
+    with open(".db_{}.json".format(cls.__name__), 'r') as f:
+        for obj_id, obj_json in json.load(f).items():
+            created_at = obj_json.pop('created_at')
+            updated_at = obj_json.pop('updated_at')
+            obj = cls(**obj_json)
+            obj.created_at = datetime.strptime(created_at, TIMESTAMP_FORMAT)
+            obj.updated_at = datetime.strptime(updated_at, TIMESTAMP_FORMAT)
+            objs[obj_id] = obj
+    return objs
+
+
+def run(mode: str) -> None:
+    """ Loads the users in one mode and prints its timings """
+    from models.user import User
+    start = time.perf_counter()
+    if mode == "legacy":
+        legacy_load(User)
+    else:
+        User.load_from_file(lazy=(mode == "lazy"))
+    loaded = time.perf_counter() - start
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print("{:>10}: {:7.2f}s to load, peak RSS {:7.1f} MiB".format(
+        mode, loaded, peak))
+
+
+def generate(size: int) -> None:
+    """ Writes a snapshot of 'size' users to the current directory """
+    now = datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%S")
+    with open(".db_User.json", 'w') as f:
+        f.write("{")
+        for i in range(size):
+            obj_id = str(uuid.uuid4())
+            f.write("{}{}: {}".format("" if i == 0 else ", ",
+                                      json.dumps(obj_id), json.dumps({
+                                          "id": obj_id, "created_at": now,
+                                          "updated_at": now,
+                                          "email": "user{}@example.com"
+                                          .format(i),
+                                          "_password": None,
+                                          "first_name": None,
+                                          "last_name": None})))
+        f.write("}")
+
+
+if __name__ == "__main__":
+    if os.getenv("BENCH_MODE"):
+        run(os.getenv("BENCH_MODE"))
+        sys.exit(0)
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    root = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        generate(size)
+        print("{} users".format(size))
+        for mode in MODES:
+            env = dict(os.environ, BENCH_MODE=mode, PYTHONPATH=root)
+            subprocess.run([sys.executable, "-m", "benchmarks.startup"],
+                           env=env, check=True)
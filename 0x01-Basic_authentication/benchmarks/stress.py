@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+Concurrent POST/PUT/DELETE/GET stress run against the users API
+
+Usage: python3 -m benchmarks.stress [THREADS] [USERS_PER_THREAD]
+
+Each thread creates its own users, renames them, deletes every other one
+and lists all users while the others do the same. The run fails if a
+request errors, if an update is lost, or if the in-memory store and the
+reloaded files disagree afterwards.
+"""
+import os
+import sys
+import tempfile
+import threading
+
+root = os.getcwd()
+workdir = tempfile.mkdtemp()
+os.chdir(workdir)
+from api.v1.app import app  # noqa: E402
+from models.user import User  # noqa: E402
+
+threads = int(sys.argv[1]) if len(sys.argv) > 1 else 16
+per_thread = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+errors = []
+kept = {}
+
+
+def worker(n: int) -> None:
+    """ Runs one client's share of the requests """
+    client = app.test_client()
+    for i in range(per_thread):
+        email = "t{}-{}@example.com".format(n, i)
+        r = client.post('/api/v1/users',
+                        json={'email': email, 'password': 'pwd'})
+        if r.status_code != 201:
+            errors.append(("POST", r.status_code))
+            continue
+        user_id = r.get_json()['id']
+        r = client.put('/api/v1/users/{}'.format(user_id),
+                       json={'first_name': email})
+        if r.status_code != 200:
+            errors.append(("PUT", r.status_code))
+        if i % 2:
+            r = client.delete('/api/v1/users/{}'.format(user_id))
+            if r.status_code != 200:
+                errors.append(("DELETE", r.status_code))
+        else:
+            kept[user_id] = email
+        r = client.get('/api/v1/users')
+        if r.status_code != 200:
+            errors.append(("GET", r.status_code))
+
+
+pool = [threading.Thread(target=worker, args=(n,)) for n in range(threads)]
+for thread in pool:
+    thread.start()
+for thread in pool:
+    thread.join()
+
+in_memory = {user.id: user.first_name for user in User.all()}
+User.load_from_file()
+on_disk = {user.id: user.first_name for user in User.all()}
+lost = [user_id for user_id, email in kept.items()
+        if in_memory.get(user_id) != email]
+print("{} requests, {} errors, {} lost updates, disk {} memory".format(
+    threads * per_thread * 4, len(errors), len(lost),
+    "matches" if on_disk == in_memory else "DIFFERS FROM"))
+os.chdir(root)
+sys.exit(1 if errors or lost or on_disk != in_memory else 0)
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Storage and API throughput on a synthetic, seeded set of users
+
+Usage: python3 -m benchmarks.suite [--size N] [--seed S] [--repeat R]
+       (with the repository root on PYTHONPATH, as benchmark.py runs it)
+Prints a JSON object of {metric: {"value": ..., "unit": ...}}. The store
+files are written to a temporary directory.
+"""
+import argparse
+import json
+import os
+import random
+import tempfile
+from typing import List
+
+from api.v1.app import app
+from benchmark import throughput
+from models.user import User
+
+
+def make_users(size: int, rng: random.Random) -> List[User]:
+    """ Returns 'size' synthetic users """
+    users = []
+    for i in range(size):
+        user = User(email="user{}@example.com".format(i),
+                    first_name=rng.choice(("Ada", "Bob", "Eve", "Sam")),
+                    last_name="Last{}".format(rng.randrange(size)))
+        user.password = "pwd{}".format(i)
+        users.append(user)
+    return users
+
+
+def run(size: int, seed: int, repeat: int) -> dict:
+    """ Runs every case and returns the results """
+    rng = random.Random(seed)
+    User.save_many(make_users(size, rng))
+    User.save_to_file()
+    ids = [user.id for user in User.all()]
+    emails = [{"email": "user{}@example.com".format(rng.randrange(size))}
+              for _ in range(1000)]
+    new_users = make_users(max(size // 10, 1), rng)
+    client = app.test_client()
+
+    def load(_) -> None:
+        User.load_from_file(lazy=False)
+
+    load_rate = throughput(load, [None], repeat) * size
+    return {
+        "storage.save": {
+            "value": throughput(User.save, new_users, repeat),
+            "unit": "saves/s"},
+        "storage.search_indexed": {
+            "value": throughput(User.search, emails, repeat),
+            "unit": "searches/s"},
+        "storage.search_scan": {
+            "value": throughput(User.search, [{"first_name": "Eve"}] * 10,
+                                repeat),
+            "unit": "searches/s"},
+        "storage.load_from_file": {
+            "value": load_rate,
+            "unit": "users/s"},
+        "api.users_page": {
+            "value": throughput(
+                lambda _: client.get("/api/v1/users?limit=100"),
+                range(200), repeat),
+            "unit": "requests/s"},
+        "api.user_get": {
+            "value": throughput(
+                lambda user_id: client.get("/api/v1/users/" + user_id),
+                rng.sample(ids, min(len(ids), 1000)), repeat),
+            "unit": "requests/s"},
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--size", type=int, default=10000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as workdir:
+        os.chdir(workdir)
+        results = run(args.size, args.seed, args.repeat)
+    print(json.dumps(results, indent=2))
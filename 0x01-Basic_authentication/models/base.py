@@ -1,40 +1,256 @@
 #!/usr/bin/env python3
 """ Base module
 """
-from datetime import datetime
-from typing import TypeVar, List, Iterable
+from datetime import datetime, timedelta
+from functools import wraps
+from metrics import timed
+from models.storage import SQLiteStorage, Storage
+from typing import Any, IO, Iterator, TypeVar, List, Iterable, Tuple
 from os import path
+import heapq
 import json
+import os
+import re
+import threading
+import time
 import uuid
 
 
 TIMESTAMP_FORMAT = "%Y-%m-%dT%H:%M:%S"
 DATA = {}
+INDEXES = {}
+JOURNAL_ENTRIES = {}
+COMPACT_EVERY = int(os.getenv("DB_COMPACT_EVERY", "1000"))
+LAZY_LOAD = os.getenv("DB_LAZY_LOAD", "0") == "1"
+PENDING = {}
+VERSIONS = {}
+SIGNUPS = {}
+SIGNUP_BUCKET = 3600
+STORAGE = SQLiteStorage(os.getenv("DB_SQLITE_PATH")) \
+    if os.getenv("DB_SQLITE_PATH") else None
+_WHITESPACE = re.compile(r"\s*")
+EPOCH = datetime(1970, 1, 1)
+_LOCK = threading.RLock()
+
+
+def _locked(method):
+    """ Serialize a mutation of the store behind the writer lock
+
+    Readers never take the lock: they work on snapshots of DATA and of the
+    indexes taken with list(), which copies a dict in a single step.
+    """
+    @wraps(method)
+    def wrapper(*args, **kwargs):
+        with _LOCK:
+            return method(*args, **kwargs)
+    return wrapper
+
+
+def parse_timestamp(value: str) -> datetime:
+    """ Parse a TIMESTAMP_FORMAT string, taking the fast fixed-format path
+    whenever the string has the exact expected shape
+    """
+    if len(value) == 19 and value[10] == 'T':
+        try:
+            return datetime.fromisoformat(value)
+        except ValueError:
+            pass
+    return datetime.strptime(value, TIMESTAMP_FORMAT)
+
+
+def iter_json_items(f: IO[str],
+                    chunk_size: int = 1 << 16) -> Iterator[Tuple[str, Any]]:
+    """ Yield the (key, value) pairs of the JSON object stored in 'f' one at
+    a time, reading it in chunks instead of decoding the whole document
+    """
+    decoder = json.JSONDecoder()
+    buf = ""
+    pos = 0
+    started = False
+    while True:
+        chunk = f.read(chunk_size)
+        buf = buf[pos:] + chunk
+        pos = 0
+        while True:
+            pos = _WHITESPACE.match(buf, pos).end()
+            if pos >= len(buf):
+                break
+            if not started:
+                if buf[pos] != '{':
+                    raise ValueError("Expected a JSON object")
+                started = True
+                pos += 1
+                continue
+            if buf[pos] == '}':
+                return
+            if buf[pos] == ',':
+                pos += 1
+                continue
+            try:
+                key, end = decoder.raw_decode(buf, pos)
+                end = _WHITESPACE.match(buf, end).end()
+                if end >= len(buf):
+                    break
+                if buf[end] != ':':
+                    raise ValueError("Expected ':' at {}".format(end))
+                end = _WHITESPACE.match(buf, end + 1).end()
+                value, end = decoder.raw_decode(buf, end)
+            except json.JSONDecodeError:
+                if not chunk:
+                    raise
+                break
+            yield key, value
+            pos = end
+        if not chunk:
+            if started:
+                raise ValueError("Truncated JSON object")
+            return
+
+
+def use_storage(storage: Storage = None):
+    """ Persist objects in a shared Storage backend instead of the local
+    files; DATA then acts as a read cache of that backend
+    """
+    global STORAGE
+    STORAGE = storage
+    VERSIONS.clear()
 
 
 class Base():
     """ Base class
+
+    Subclasses can declare secondary indexes with '__indexes__', a tuple of
+    attribute names holding hashable values. Each one is kept as a hash map
+    from value to the stored objects with that value, and 'search' uses it
+    whenever a query matches an indexed attribute.
+
+    Instances are compact: attributes live in '__slots__' and timestamps are
+    stored as integer seconds since the epoch. Subclasses declare their own
+    '__slots__', which also give the order of the keys in 'to_json'.
     """
 
+    __slots__ = ('id', '_created_at', '_updated_at')
+    __indexes__ = ()
+    _TIMESTAMPS = {'_created_at': 'created_at', '_updated_at': 'updated_at'}
+
     def __init__(self, *args: list, **kwargs: dict):
         """ Initialize a Base instance
         """
         s_class = str(self.__class__.__name__)
-        if DATA.get(s_class) is None:
-            DATA[s_class] = {}
+        DATA.setdefault(s_class, {})
 
         self.id = kwargs.get('id', str(uuid.uuid4()))
         if kwargs.get('created_at') is not None:
-            self.created_at = datetime.strptime(kwargs.get('created_at'),
-                                                TIMESTAMP_FORMAT)
+            self.created_at = parse_timestamp(kwargs.get('created_at'))
         else:
             self.created_at = datetime.utcnow()
         if kwargs.get('updated_at') is not None:
-            self.updated_at = datetime.strptime(kwargs.get('updated_at'),
-                                                TIMESTAMP_FORMAT)
+            self.updated_at = parse_timestamp(kwargs.get('updated_at'))
         else:
             self.updated_at = datetime.utcnow()
 
+    def __setattr__(self, name: str, value) -> None:
+        """ Keeps the secondary indexes in sync with attribute updates
+        """
+        if name not in self.__indexes__:
+            super().__setattr__(name, value)
+            return
+        with _LOCK:
+            stored = self._is_stored()
+            if stored:
+                self._unindex((name,))
+            super().__setattr__(name, value)
+            if stored:
+                self._index((name,))
+
+    def _is_stored(self) -> bool:
+        """ Whether this very object is the one held in DATA
+        """
+        objs = DATA.get(self.__class__.__name__, {})
+        return objs.get(getattr(self, 'id', None)) is self
+
+    @property
+    def created_at(self) -> datetime:
+        """ Creation time, stored as seconds since the epoch
+        """
+        return EPOCH + timedelta(seconds=self._created_at)
+
+    @created_at.setter
+    def created_at(self, value: datetime):
+        self._created_at = int((value - EPOCH).total_seconds())
+
+    @property
+    def updated_at(self) -> datetime:
+        """ Last update time, stored as seconds since the epoch
+        """
+        return EPOCH + timedelta(seconds=self._updated_at)
+
+    @updated_at.setter
+    def updated_at(self, value: datetime):
+        self._updated_at = int((value - EPOCH).total_seconds())
+
+    @classmethod
+    def _json_attributes(cls) -> Tuple[Tuple[str, str], ...]:
+        """ Return the (slot, JSON key) pairs of the class, in order
+        """
+        attrs = cls.__dict__.get('_json_attrs')
+        if attrs is None:
+            attrs = tuple((name, cls._TIMESTAMPS.get(name, name))
+                          for klass in reversed(cls.__mro__)
+                          for name in klass.__dict__.get('__slots__', ())
+                          if name != '__dict__')
+            cls._json_attrs = attrs
+        return attrs
+
+    @classmethod
+    def _indexes(cls) -> dict:
+        """ Return the secondary indexes of the class
+        """
+        s_class = cls.__name__
+        if INDEXES.get(s_class) is None:
+            INDEXES[s_class] = {attr: {} for attr in cls.__indexes__}
+        return INDEXES[s_class]
+
+    def _index(self, attrs: Iterable[str] = None):
+        """ Add this object to the secondary indexes, and to the creation
+        counters when the whole object is added
+        """
+        if attrs is None:
+            buckets = SIGNUPS.setdefault(self.__class__.__name__, {})
+            bucket = self._created_at // SIGNUP_BUCKET
+            buckets[bucket] = buckets.get(bucket, 0) + 1
+        indexes = self._indexes()
+        for attr in attrs or self.__indexes__:
+            value = getattr(self, attr, None)
+            try:
+                indexes[attr].setdefault(value, {})[self.id] = self
+            except TypeError:
+                # Unhashable values stay out of the index; search scans
+                continue
+
+    def _unindex(self, attrs: Iterable[str] = None):
+        """ Remove this object from the secondary indexes, and from the
+        creation counters when the whole object is removed
+        """
+        if attrs is None:
+            buckets = SIGNUPS.setdefault(self.__class__.__name__, {})
+            bucket = self._created_at // SIGNUP_BUCKET
+            if buckets.get(bucket, 0) > 1:
+                buckets[bucket] -= 1
+            else:
+                buckets.pop(bucket, None)
+        indexes = self._indexes()
+        for attr in attrs or self.__indexes__:
+            value = getattr(self, attr, None)
+            try:
+                bucket = indexes[attr].get(value)
+            except TypeError:
+                continue
+            if bucket is not None and bucket.get(self.id) is self:
+                del bucket[self.id]
+                if not bucket:
+                    del indexes[attr][value]
+
     def __eq__(self, other: TypeVar('Base')) -> bool:
         """ Equality
         """
@@ -44,13 +260,34 @@ class Base():
             return False
         return (self.id == other.id)
 
-    def to_json(self, for_serialization: bool = False) -> dict:
-        """ Convert the object a JSON dictionary
+    def to_json(self, for_serialization: bool = False,
+                keys: Iterable[str] = None) -> dict:
+        """ Convert the object a JSON dictionary, with only the 'keys' asked
+        for when given
         """
+        wanted = None if keys is None else frozenset(keys)
         result = {}
-        for key, value in self.__dict__.items():
+        for name, key in self._json_attributes():
+            if not for_serialization and key[0] == '_':
+                continue
+            if wanted is not None and key not in wanted:
+                continue
+            try:
+                value = getattr(self, name)
+            except AttributeError:
+                continue
+            if name in self._TIMESTAMPS:
+                result[key] = time.strftime(TIMESTAMP_FORMAT,
+                                            time.gmtime(value))
+            elif type(value) is datetime:
+                result[key] = value.strftime(TIMESTAMP_FORMAT)
+            else:
+                result[key] = value
+        for key, value in getattr(self, '__dict__', {}).items():
             if not for_serialization and key[0] == '_':
                 continue
+            if wanted is not None and key not in wanted:
+                continue
             if type(value) is datetime:
                 result[key] = value.strftime(TIMESTAMP_FORMAT)
             else:
@@ -58,55 +295,266 @@ class Base():
         return result
 
     @classmethod
-    def load_from_file(cls):
-        """ Load all objects from file
+    @timed("model_file_seconds", op="load")
+    @_locked
+    def load_from_file(cls, lazy: bool = None):
+        """ Load all objects from the snapshot file, then replay the
+        mutations appended to the journal since that snapshot
+
+        A torn entry left by a crash ends the replay and is cut off the
+        journal, so that later entries are not appended to it.
+
+        The snapshot is decoded one object at a time. When 'lazy' is True
+        (LAZY_LOAD by default), objects are only built when first needed:
+        'get' builds a single one, while 'search' and 'all' build them all.
         """
         s_class = cls.__name__
+        lazy = LAZY_LOAD if lazy is None else lazy
         file_path = ".db_{}.json".format(s_class)
         DATA[s_class] = {}
-        if not path.exists(file_path):
+        INDEXES[s_class] = None
+        SIGNUPS[s_class] = {}
+        PENDING[s_class] = {}
+        JOURNAL_ENTRIES[s_class] = 0
+        if STORAGE is not None:
+            VERSIONS[s_class], objs_json = STORAGE.load(s_class)
+            for obj_id, obj_json in objs_json:
+                obj = cls(**obj_json)
+                DATA[s_class][obj_id] = obj
+                obj._index()
             return
+        if path.exists(file_path):
+            with open(file_path, 'r') as f:
+                for obj_id, obj_json in iter_json_items(f):
+                    if lazy:
+                        PENDING[s_class][obj_id] = obj_json
+                    else:
+                        obj = cls(**obj_json)
+                        DATA[s_class][obj_id] = obj
+                        obj._index()
 
-        with open(file_path, 'r') as f:
-            objs_json = json.load(f)
-            for obj_id, obj_json in objs_json.items():
-                DATA[s_class][obj_id] = cls(**obj_json)
+        journal_path = ".db_{}.journal".format(s_class)
+        if not path.exists(journal_path):
+            return
+        replayed = 0
+        with open(journal_path, 'rb') as f:
+            for line in f:
+                try:
+                    if not line.endswith(b"\n"):
+                        raise ValueError("Torn journal entry")
+                    entry = json.loads(line)
+                except ValueError:
+                    break
+                replayed += len(line)
+                if entry.get('op') == 'save' and lazy:
+                    cls._discard(entry['id'])
+                    PENDING[s_class][entry['id']] = entry['obj']
+                elif entry.get('op') == 'save':
+                    cls._store(cls(**entry['obj']))
+                elif entry.get('op') == 'remove':
+                    cls._discard(entry['id'])
+                JOURNAL_ENTRIES[s_class] += 1
+        if replayed < path.getsize(journal_path):
+            with open(journal_path, 'r+b') as f:
+                f.truncate(replayed)
 
     @classmethod
+    def _materialize(cls, obj_id: str = None):
+        """ Build the lazily loaded object 'obj_id', or all of them
+
+        The writer lock is only taken when there is something to build, so
+        readers of a fully built store never wait on writers.
+        """
+        pending = PENDING.get(cls.__name__)
+        if not pending or (obj_id is not None and obj_id not in pending):
+            return
+        with _LOCK:
+            obj_ids = list(pending) if obj_id is None else [obj_id]
+            for key in obj_ids:
+                obj_json = pending.pop(key, None)
+                if obj_json is not None:
+                    obj = cls(**obj_json)
+                    DATA[cls.__name__][key] = obj
+                    obj._index()
+
+    @classmethod
+    @timed("model_file_seconds", op="save")
+    @_locked
     def save_to_file(cls):
-        """ Save all objects to file
+        """ Compact all objects into a new snapshot file
+
+        The snapshot is written to a temporary file and renamed over the
+        old one, so a crash never leaves a torn file, and the journal is
+        emptied afterwards.
         """
         s_class = cls.__name__
         file_path = ".db_{}.json".format(s_class)
-        objs_json = {}
-        for obj_id, obj in DATA[s_class].items():
+        objs_json = dict(PENDING.get(s_class) or {})
+        for obj_id, obj in list(DATA[s_class].items()):
             objs_json[obj_id] = obj.to_json(True)
 
-        with open(file_path, 'w') as f:
+        tmp_path = "{}.tmp".format(file_path)
+        with open(tmp_path, 'w') as f:
             json.dump(objs_json, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, file_path)
+        open(".db_{}.journal".format(s_class), 'w').close()
+        JOURNAL_ENTRIES[s_class] = 0
+
+    @classmethod
+    @_locked
+    def _journal(cls, *entries: dict):
+        """ Append mutations to the journal in one write, compacting it
+        into the snapshot every COMPACT_EVERY entries
+        """
+        s_class = cls.__name__
+        count = JOURNAL_ENTRIES.get(s_class, 0) + len(entries)
+        if count >= COMPACT_EVERY:
+            cls.save_to_file()
+            return
+        with open(".db_{}.journal".format(s_class), 'a') as f:
+            f.write("".join(json.dumps(entry) + "\n" for entry in entries))
+        JOURNAL_ENTRIES[s_class] = count
+
+    @classmethod
+    def _refresh(cls):
+        """ Apply the changes other workers made to the shared storage
+        since this worker last looked at its change counter
+        """
+        if STORAGE is None:
+            return
+        s_class = cls.__name__
+        if STORAGE.version(s_class) == VERSIONS.get(s_class):
+            return
+        with _LOCK:
+            DATA.setdefault(s_class, {})
+            version, changes = STORAGE.changes(s_class,
+                                               VERSIONS.get(s_class, 0))
+            if changes is None:
+                cls.load_from_file()
+                return
+            for obj_id, obj_json in changes:
+                if obj_json is None:
+                    cls._discard(obj_id)
+                else:
+                    cls._store(cls(**obj_json))
+            VERSIONS[s_class] = version
+
+    @classmethod
+    @_locked
+    def _persist(cls, obj_id: str, obj_json: dict = None):
+        """ Write a saved object, or the removal of 'obj_id' when 'obj_json'
+        is None, to the shared storage or else to the journal
+        """
+        s_class = cls.__name__
+        if STORAGE is None:
+            if obj_json is None:
+                cls._journal({'op': 'remove', 'id': obj_id})
+            else:
+                cls._journal({'op': 'save', 'id': obj_id, 'obj': obj_json})
+            return
+        if obj_json is None:
+            version = STORAGE.remove(s_class, obj_id)
+        else:
+            version = STORAGE.save(s_class, obj_id, obj_json)
+        if VERSIONS.get(s_class, 0) == version - 1:
+            VERSIONS[s_class] = version
+        if version % COMPACT_EVERY == 0:
+            STORAGE.compact(s_class, COMPACT_EVERY)
 
+    @classmethod
+    @_locked
+    def _store(cls, obj: TypeVar('Base')):
+        """ Put an object in DATA and the indexes, replacing any other
+        object with the same ID
+        """
+        objs = DATA[cls.__name__]
+        PENDING.get(cls.__name__, {}).pop(obj.id, None)
+        previous = objs.get(obj.id)
+        if previous is not obj:
+            if previous is not None:
+                previous._unindex()
+            obj._index()
+            objs[obj.id] = obj
+
+    @classmethod
+    @_locked
+    def _discard(cls, obj_id: str):
+        """ Drop an object from DATA and the indexes
+        """
+        PENDING.get(cls.__name__, {}).pop(obj_id, None)
+        obj = DATA[cls.__name__].pop(obj_id, None)
+        if obj is not None:
+            obj._unindex()
+
+    @classmethod
+    @_locked
+    def save_many(cls, objs: List[TypeVar('Base')]):
+        """ Save many objects with a single write to the journal, the
+        snapshot or the shared storage
+        """
+        s_class = cls.__name__
+        now = datetime.utcnow()
+        cls._refresh()
+        for obj in objs:
+            obj.updated_at = now
+            cls._store(obj)
+        if STORAGE is None:
+            cls._journal(*({'op': 'save', 'id': obj.id,
+                            'obj': obj.to_json(True)} for obj in objs))
+            return
+        version = STORAGE.save_many(s_class, [(obj.id, obj.to_json(True))
+                                              for obj in objs])
+        if VERSIONS.get(s_class, 0) == version - 1:
+            VERSIONS[s_class] = version
+
+    @_locked
     def save(self):
         """ Save current object
         """
-        s_class = self.__class__.__name__
         self.updated_at = datetime.utcnow()
-        DATA[s_class][self.id] = self
-        self.__class__.save_to_file()
+        self.__class__._refresh()
+        self.__class__._store(self)
+        self.__class__._persist(self.id, self.to_json(True))
 
+    @_locked
     def remove(self):
         """ Remove object
         """
         s_class = self.__class__.__name__
+        self.__class__._refresh()
+        self.__class__._materialize(self.id)
         if DATA[s_class].get(self.id) is not None:
-            del DATA[s_class][self.id]
-            self.__class__.save_to_file()
+            self.__class__._discard(self.id)
+            self.__class__._persist(self.id)
 
     @classmethod
     def count(cls) -> int:
         """ Count all objects
         """
         s_class = cls.__name__
-        return len(DATA[s_class].keys())
+        cls._refresh()
+        return len(DATA[s_class].keys()) + len(PENDING.get(s_class) or {})
+
+    @classmethod
+    def count_recent(cls, seconds: int = 86400) -> int:
+        """ Count the objects created in the last 'seconds' seconds, from
+        counters kept per SIGNUP_BUCKET seconds of creation time
+
+        Lazily loaded objects are counted from their stored creation time,
+        without building them.
+        """
+        s_class = cls.__name__
+        cls._refresh()
+        first = (int(time.time()) - seconds) // SIGNUP_BUCKET
+        since = (EPOCH + timedelta(seconds=first * SIGNUP_BUCKET)).strftime(
+            TIMESTAMP_FORMAT)
+        pending = list((PENDING.get(s_class) or {}).values())
+        return sum(n for bucket, n in list(SIGNUPS.get(s_class, {}).items())
+                   if bucket >= first) + \
+            sum(1 for obj_json in pending
+                if obj_json.get('created_at', since) >= since)
 
     @classmethod
     def all(cls) -> Iterable[TypeVar('Base')]:
@@ -119,9 +567,29 @@ class Base():
         """ Return one object by ID
         """
         s_class = cls.__name__
+        cls._refresh()
+        cls._materialize(id)
         return DATA[s_class].get(id)
 
     @classmethod
+    def page(cls, after: str = None,
+             limit: int = None) -> List[TypeVar('Base')]:
+        """ Return up to 'limit' objects ordered by ID, starting after the
+        ID 'after', without sorting the whole collection
+        """
+        cls._refresh()
+        cls._materialize()
+        objs = DATA[cls.__name__]
+        obj_ids = (obj_id for obj_id in list(objs)
+                   if after is None or obj_id > after)
+        if limit is None:
+            ordered = sorted(obj_ids)
+        else:
+            ordered = heapq.nsmallest(limit, obj_ids)
+        return [obj for obj in map(objs.get, ordered) if obj is not None]
+
+    @classmethod
+    @timed("model_search_seconds")
     def search(cls, attributes: dict = {}) -> List[TypeVar('Base')]:
         """ Search all objects with matching attributes
         """
@@ -133,5 +601,18 @@ class Base():
                 if (getattr(obj, k) != v):
                     return False
             return True
-        
-        return list(filter(_search, DATA[s_class].values()))
+
+        cls._refresh()
+        cls._materialize()
+        candidates = None
+        indexes = cls._indexes()
+        for k, v in attributes.items():
+            if k in indexes:
+                try:
+                    candidates = list(indexes[k].get(v, {}).values())
+                except TypeError:
+                    continue
+                break
+        if candidates is None:
+            candidates = list(DATA[s_class].values())
+        return list(filter(_search, candidates))
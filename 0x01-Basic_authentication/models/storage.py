@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+""" Storage module
+"""
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+import json
+import queue
+import sqlite3
+from typing import Iterator, List, Optional, Tuple
+
+
+class Storage(ABC):
+    """ Shared persistence backend for Base objects
+
+    Every mutation of a class bumps its change counter. Workers compare
+    the counter with the last one they saw and fetch only the changes made
+    since, so an in-memory copy can serve as a read cache.
+    """
+
+    @abstractmethod
+    def load(self, s_class: str) -> Tuple[int, Iterator[Tuple[str, dict]]]:
+        """ Return the change counter of a class and all its objects
+        """
+
+    @abstractmethod
+    def save(self, s_class: str, obj_id: str, obj_json: dict) -> int:
+        """ Insert or replace an object, return the new change counter
+        """
+
+    @abstractmethod
+    def save_many(self, s_class: str,
+                  objs_json: List[Tuple[str, dict]]) -> int:
+        """ Insert or replace many (ID, object) pairs as one change,
+        return the new change counter
+        """
+
+    @abstractmethod
+    def remove(self, s_class: str, obj_id: str) -> int:
+        """ Delete an object, return the new change counter
+        """
+
+    @abstractmethod
+    def version(self, s_class: str) -> int:
+        """ Return the change counter of a class
+        """
+
+    @abstractmethod
+    def changes(self, s_class: str, since: int
+                ) -> Tuple[int, Optional[List[Tuple[str, Optional[dict]]]]]:
+        """ Return the change counter and the objects saved or removed
+        after 'since'; removed objects come with None
+
+        When removals made after 'since' have been pruned, the list is None
+        and the caller must load the class again.
+        """
+
+    @abstractmethod
+    def compact(self, s_class: str, keep: int) -> None:
+        """ Prune the removals older than the last 'keep' changes
+        """
+
+
+class SQLiteStorage(Storage):
+    """ Storage in a SQLite file in WAL mode, shared by many processes
+    """
+
+    SCHEMA = (
+        "CREATE TABLE IF NOT EXISTS versions ("
+        " class TEXT PRIMARY KEY, version INTEGER NOT NULL)",
+        "CREATE TABLE IF NOT EXISTS objects ("
+        " class TEXT NOT NULL, id TEXT NOT NULL, data TEXT,"
+        " version INTEGER NOT NULL, PRIMARY KEY (class, id))",
+        "CREATE INDEX IF NOT EXISTS objects_version"
+        " ON objects (class, version)",
+        "CREATE TABLE IF NOT EXISTS pruned ("
+        " class TEXT PRIMARY KEY, version INTEGER NOT NULL)",
+    )
+
+    def __init__(self, file_path: str, timeout: float = 30.0,
+                 pool_size: int = 8):
+        self.file_path = file_path
+        self.timeout = timeout
+        self._idle = queue.LifoQueue(maxsize=pool_size)
+        with self._transaction("BEGIN IMMEDIATE") as db:
+            for statement in self.SCHEMA:
+                db.execute(statement)
+
+    @contextmanager
+    def _connection(self) -> Iterator[sqlite3.Connection]:
+        """ Lend an idle connection, opening one when none is left
+
+        Connections are handed back to a pool of at most 'pool_size', so
+        that a thread per request does not mean a connection per request.
+        """
+        try:
+            db = self._idle.get_nowait()
+        except queue.Empty:
+            db = sqlite3.connect(self.file_path, timeout=self.timeout,
+                                 isolation_level=None,
+                                 check_same_thread=False)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+        try:
+            yield db
+        finally:
+            try:
+                self._idle.put_nowait(db)
+            except queue.Full:
+                db.close()
+
+    @contextmanager
+    def _transaction(self, begin: str = "BEGIN"):
+        """ Run a transaction on a pooled connection
+        """
+        with self._connection() as db:
+            db.execute(begin)
+            try:
+                yield db
+            except BaseException:
+                db.execute("ROLLBACK")
+                raise
+            db.execute("COMMIT")
+
+    @staticmethod
+    def _bump(db: sqlite3.Connection, s_class: str) -> int:
+        """ Increment the change counter of a class inside a transaction
+        """
+        return db.execute(
+            "INSERT INTO versions (class, version) VALUES (?, 1)"
+            " ON CONFLICT (class) DO UPDATE SET version = version + 1"
+            " RETURNING version", (s_class,)).fetchone()[0]
+
+    def load(self, s_class: str) -> Tuple[int, Iterator[Tuple[str, dict]]]:
+        """ Return the change counter of a class and all its objects
+        """
+        with self._transaction() as db:
+            version = self._version(db, s_class)
+            rows = db.execute(
+                "SELECT id, data FROM objects"
+                " WHERE class = ? AND data IS NOT NULL", (s_class,)).fetchall()
+        return version, ((obj_id, json.loads(data)) for obj_id, data in rows)
+
+    def save(self, s_class: str, obj_id: str, obj_json: dict) -> int:
+        """ Insert or replace an object, return the new change counter
+        """
+        with self._transaction("BEGIN IMMEDIATE") as db:
+            version = self._bump(db, s_class)
+            db.execute("INSERT OR REPLACE INTO objects (class, id, data,"
+                       " version) VALUES (?, ?, ?, ?)",
+                       (s_class, obj_id, json.dumps(obj_json), version))
+        return version
+
+    def save_many(self, s_class: str,
+                  objs_json: List[Tuple[str, dict]]) -> int:
+        """ Insert or replace many (ID, object) pairs in one transaction,
+        return the new change counter
+        """
+        with self._transaction("BEGIN IMMEDIATE") as db:
+            version = self._bump(db, s_class)
+            db.executemany("INSERT OR REPLACE INTO objects (class, id, data,"
+                           " version) VALUES (?, ?, ?, ?)",
+                           ((s_class, obj_id, json.dumps(obj_json), version)
+                            for obj_id, obj_json in objs_json))
+        return version
+
+    def remove(self, s_class: str, obj_id: str) -> int:
+        """ Delete an object, keeping a tombstone so other workers see the
+        removal, and return the new change counter
+        """
+        with self._transaction("BEGIN IMMEDIATE") as db:
+            version = self._bump(db, s_class)
+            db.execute("INSERT OR REPLACE INTO objects (class, id, data,"
+                       " version) VALUES (?, ?, NULL, ?)",
+                       (s_class, obj_id, version))
+        return version
+
+    @staticmethod
+    def _version(db: sqlite3.Connection, s_class: str) -> int:
+        """ Read the change counter of a class
+        """
+        row = db.execute("SELECT version FROM versions WHERE class = ?",
+                         (s_class,)).fetchone()
+        return row[0] if row else 0
+
+    def version(self, s_class: str) -> int:
+        """ Return the change counter of a class
+        """
+        with self._connection() as db:
+            return self._version(db, s_class)
+
+    def changes(self, s_class: str, since: int
+                ) -> Tuple[int, Optional[List[Tuple[str, Optional[dict]]]]]:
+        """ Return the change counter and the objects saved or removed
+        after 'since'; removed objects come with None
+
+        When removals made after 'since' have been pruned, the list is None
+        and the caller must load the class again.
+        """
+        with self._transaction() as db:
+            version = self._version(db, s_class)
+            row = db.execute("SELECT version FROM pruned WHERE class = ?",
+                             (s_class,)).fetchone()
+            if row is not None and since < row[0]:
+                return version, None
+            rows = db.execute(
+                "SELECT id, data FROM objects WHERE class = ? AND version > ?"
+                " ORDER BY version", (s_class, since)).fetchall()
+        return version, [(obj_id, json.loads(data) if data else None)
+                         for obj_id, data in rows]
+
+    def compact(self, s_class: str, keep: int) -> None:
+        """ Delete the tombstones older than the last 'keep' changes and
+        remember up to which change they are gone
+        """
+        with self._transaction("BEGIN IMMEDIATE") as db:
+            horizon = self._version(db, s_class) - keep
+            if horizon <= 0:
+                return
+            db.execute("DELETE FROM objects WHERE class = ? AND data IS NULL"
+                       " AND version <= ?", (s_class, horizon))
+            db.execute("INSERT INTO pruned (class, version) VALUES (?, ?)"
+                       " ON CONFLICT (class) DO UPDATE SET version ="
+                       " excluded.version", (s_class, horizon))
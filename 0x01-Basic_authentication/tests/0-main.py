@@ -0,0 +1,29 @@
+#!/usr/bin/env python3
+"""
+Main file: journal replay after a torn append
+"""
+import os
+import tempfile
+
+from models.user import User
+
+os.chdir(tempfile.mkdtemp())
+
+first = User(email="first@example.com")
+first.save()
+with open(".db_User.journal", "a") as f:
+    f.write('{"op": "save", "id": "torn", "obj": {"em')
+
+User.load_from_file()
+print(User.count())
+
+second = User(email="second@example.com")
+second.save()
+third = User(email="third@example.com")
+third.save()
+third.remove()
+
+User.load_from_file()
+print(sorted(user.email for user in User.all()))
+User.load_from_file(lazy=True)
+print(User.count())
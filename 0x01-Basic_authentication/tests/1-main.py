@@ -0,0 +1,28 @@
+#!/usr/bin/env python3
+"""
+Main file: users whose indexed attribute is not hashable
+"""
+import os
+import tempfile
+
+from models.user import User
+
+os.chdir(tempfile.mkdtemp())
+
+odd = User(email=["odd@example.com"])
+odd.save()
+plain = User(email="plain@example.com")
+plain.save()
+print(len(User.search({"email": ["odd@example.com"]})))
+print(len(User.search({"email": "odd@example.com"})))
+
+odd.email = "odd@example.com"
+print(len(User.search({"email": "odd@example.com"})))
+odd.email = {"odd": "example.com"}
+odd.save()
+print(len(User.search({"email": {"odd": "example.com"}})))
+odd.remove()
+
+User.save_many([User(email=["a@example.com"]), User(email="b@example.com")])
+User.load_from_file()
+print(User.count(), sorted(str(user.email) for user in User.all()))
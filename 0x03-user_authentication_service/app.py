@@ -2,10 +2,29 @@
 """ Creates a flask app """
 from flask import Flask, jsonify, request, abort, redirect
 from auth import Auth
+from hashing import HashingBusy, OffloadedHasher
+from metrics import REGISTRY, instrument_app
 
 
 app = Flask(__name__)
-AUTH = Auth()
+AUTH = Auth(OffloadedHasher())
+instrument_app(app, authorize=lambda: AUTH.get_user_from_session_id(
+    request.cookies.get("session_id")) is not None)
+for stat in ("hits", "misses", "size", "hit_rate"):
+    REGISTRY.gauge("auth_session_cache_" + stat,
+                   lambda stat=stat: AUTH.session_cache_stats()[stat])
+
+
+@app.teardown_appcontext
+def release_db_session(exception) -> None:
+    """ Hands the request's database session back to the pool """
+    AUTH.release_session()
+
+
+@app.errorhandler(HashingBusy)
+def hashing_busy(error) -> str:
+    """ Sheds load when the password hashing queue is full """
+    return jsonify({"message": "service busy"}), 503
 
 
 @app.route("/", strict_slashes=False)
@@ -33,9 +52,9 @@ def login() -> str:
     """
     email = request.form.get("email")
     password = request.form.get("password")
-    if not AUTH.valid_login(email, password):
+    session_id = AUTH.login(email, password)
+    if session_id is None:
         abort(401)
-    session_id = AUTH.create_session(email)
     response = jsonify({"email": email, "message": "logged in"})
     response.set_cookie("session_id", session_id)
     return response
@@ -77,7 +96,7 @@ def get_reset_password_token() -> str:
     return jsonify({"email": email, "reset_token": reset_token})
 
 
-@app.route("/reset_password", strict_slashes=False, , methods=["PUT"])
+@app.route("/reset_password", strict_slashes=False, methods=["PUT"])
 def update_password() -> str:
     """ Returns the user's password updated payload """
     email = request.form.get("email")
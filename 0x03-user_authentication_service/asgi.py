@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+""" Creates an ASGI app with the same routes as the flask app
+
+Run it with: uvicorn asgi:app --host 0.0.0.0 --port 5000
+"""
+import contextlib
+import time
+
+from starlette.applications import Starlette
+from starlette.exceptions import HTTPException
+from starlette.middleware import Middleware
+from starlette.responses import JSONResponse, PlainTextResponse, \
+    RedirectResponse
+from starlette.routing import Route
+
+from async_auth import AsyncAuth
+from hashing import HashingBusy
+from metrics import REGISTRY
+
+
+AUTH = AsyncAuth()
+for stat in ("hits", "misses", "size", "hit_rate"):
+    REGISTRY.gauge("auth_session_cache_" + stat,
+                   lambda stat=stat: AUTH.session_cache_stats()[stat])
+
+
+async def index(request) -> JSONResponse:
+    """ Returns a payload message """
+    return JSONResponse({"message": "Bienvenue"})
+
+
+async def users(request) -> JSONResponse:
+    """ Registers a new user if the email is not already registered """
+    form = await request.form()
+    email = form.get("email")
+    password = form.get("password")
+    try:
+        await AUTH.register_user(email, password)
+        return JSONResponse({"email": email, "message": "user created"})
+    except ValueError:
+        return JSONResponse({"message": "email already registered"}, 400)
+
+
+async def login(request) -> JSONResponse:
+    """ If user is validated, creates a new session and stores the session ID
+    as a cookie with the key 'session_id'
+    """
+    form = await request.form()
+    email = form.get("email")
+    session_id = await AUTH.login(email, form.get("password"))
+    if session_id is None:
+        raise HTTPException(401)
+    response = JSONResponse({"email": email, "message": "logged in"})
+    response.set_cookie("session_id", session_id)
+    return response
+
+
+async def logout(request) -> RedirectResponse:
+    """ Destroys an existing session and redirects the user to GET / """
+    user = await AUTH.get_user_from_session_id(
+        request.cookies.get("session_id"))
+    if user is None:
+        raise HTTPException(403)
+    await AUTH.destroy_session(user.id)
+    return RedirectResponse("/", status_code=302)
+
+
+async def profile(request) -> JSONResponse:
+    """ Retrieves a user profile from an existing session """
+    user = await AUTH.get_user_from_session_id(
+        request.cookies.get("session_id"))
+    if user is None:
+        raise HTTPException(403)
+    return JSONResponse({"email": user.email})
+
+
+async def get_reset_password_token(request) -> JSONResponse:
+    """ Returns the user's password reset payload """
+    email = (await request.form()).get("email")
+    try:
+        reset_token = await AUTH.get_reset_password_token(email)
+    except ValueError:
+        raise HTTPException(403)
+    return JSONResponse({"email": email, "reset_token": reset_token})
+
+
+async def update_password(request) -> JSONResponse:
+    """ Returns the user's password updated payload """
+    form = await request.form()
+    try:
+        await AUTH.update_password(form.get("reset_token"),
+                                   form.get("new_password"))
+    except ValueError:
+        raise HTTPException(403)
+    return JSONResponse({"email": form.get("email"),
+                         "message": "Password updated"})
+
+
+async def metrics(request) -> PlainTextResponse:
+    """ Returns every metric in the Prometheus text format """
+    return PlainTextResponse(REGISTRY.render(),
+                             media_type="text/plain; version=0.0.4")
+
+
+async def hashing_busy(request, error) -> JSONResponse:
+    """ Sheds load when the password hashing queue is full """
+    return JSONResponse({"message": "service busy"}, 503)
+
+
+@contextlib.asynccontextmanager
+async def lifespan(app):
+    """ Opens the database before serving and closes it afterwards """
+    await AUTH.start()
+    yield
+    await AUTH.stop()
+
+
+class RequestTimer:
+    """ Times every request into 'http_request_duration_seconds' """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        start = time.perf_counter()
+        status = []
+
+        async def send_status(message):
+            if message["type"] == "http.response.start":
+                status.append(message["status"])
+            await send(message)
+        try:
+            await self.app(scope, receive, send_status)
+        finally:
+            endpoint = scope.get("endpoint")
+            REGISTRY.observe("http_request_duration_seconds",
+                             time.perf_counter() - start,
+                             method=scope["method"],
+                             endpoint=getattr(endpoint, "__name__",
+                                              "unknown"),
+                             status=str(status[0] if status else 500))
+
+
+app = Starlette(
+    routes=[
+        Route("/", index),
+        Route("/users", users, methods=["POST"]),
+        Route("/sessions", login, methods=["POST"]),
+        Route("/sessions", logout, methods=["DELETE"]),
+        Route("/profile", profile, methods=["GET"]),
+        Route("/reset_password", get_reset_password_token, methods=["POST"]),
+        Route("/reset_password", update_password, methods=["PUT"]),
+        Route("/metrics", metrics),
+    ],
+    middleware=[Middleware(RequestTimer)],
+    exception_handlers={HashingBusy: hashing_busy},
+    lifespan=lifespan)
@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+""" Authentication for the async app """
+import asyncio
+from async_db import AsyncDB
+from auth import _detached, _generate_uuid
+from hashing import HashingBusy, OffloadedHasher
+from session_cache import SessionCache
+from sqlalchemy.orm.exc import NoResultFound
+from typing import Union
+from user import User
+
+
+class AsyncAuth:
+    """Auth class with the same flows as Auth, written for asyncio
+
+    Queries go through AsyncDB and bcrypt runs on the hasher's pool, so a
+    task waiting on either leaves the event loop free for other requests.
+    """
+
+    def __init__(self, hasher: OffloadedHasher = None,
+                 session_cache: SessionCache = None):
+        self._db = AsyncDB()
+        self._hasher = hasher or OffloadedHasher()
+        self._sessions = session_cache or SessionCache()
+        self._rehashing = {}
+
+    async def start(self) -> None:
+        """ Creates the missing tables """
+        await self._db.create_all()
+
+    async def stop(self) -> None:
+        """ Waits for pending re-hashes, then closes the database
+        connections and the hashing pool
+        """
+        await asyncio.gather(*self._rehashing.values(),
+                             return_exceptions=True)
+        await self._db.dispose()
+        self._hasher.shutdown()
+
+    def session_cache_stats(self) -> dict:
+        """ Returns the hit rate and counters of the session cache """
+        return self._sessions.stats()
+
+    async def register_user(self, email: str, password: str) -> User:
+        """ Registers a user, raising ValueError if the email is taken """
+        try:
+            await self._db.find_user_by(email=email)
+        except NoResultFound:
+            hashed = await self._hasher.hash_async(password)
+            return await self._db.add_user(email, hashed)
+        raise ValueError("User {} already exists".format(email))
+
+    async def login(self, email: str, password: str) -> Union[str, None]:
+        """ Checks the credentials and returns a new session id, or None if
+        they are invalid
+
+        An outdated hash is re-hashed in a background task.
+        """
+        try:
+            user = await self._db.find_user_by(email=email)
+        except NoResultFound:
+            return None
+        if not await self._hasher.verify_async(password,
+                                               user.hashed_password):
+            return None
+        session_id = _generate_uuid()
+        await self._db.update_user(user.id, session_id=session_id)
+        self._sessions.invalidate_user(user.id)
+        self._rehash_later(user, password)
+        return session_id
+
+    def _rehash_later(self, user: User, password: str) -> None:
+        """ Starts a re-hash of a verified password whose hash has an
+        outdated work factor, at most one per user at a time
+        """
+        if self._hasher.needs_rehash(user.hashed_password) and \
+                user.id not in self._rehashing:
+            self._rehashing[user.id] = asyncio.create_task(self._rehash(
+                user.id, password, user.hashed_password))
+
+    async def _rehash(self, user_id: int, password: str,
+                      hashed_password: bytes) -> None:
+        """ Replaces an outdated hash, unless the password was changed in
+        the meantime
+        """
+        try:
+            new_hash = await self._hasher.hash_async(password)
+            if await self._db.update_users(
+                    {"id": user_id, "hashed_password": hashed_password},
+                    hashed_password=new_hash):
+                self._sessions.invalidate_user(user_id)
+        except HashingBusy:
+            pass
+        finally:
+            del self._rehashing[user_id]
+
+    async def get_user_from_session_id(
+            self, session_id: str) -> Union[User, None]:
+        """ Retrieves a user using the session id, answering from the
+        session cache while it is fresh
+        """
+        if session_id:
+            user = self._sessions.get(session_id)
+            if user is not SessionCache.MISS:
+                return user
+            token = self._sessions.begin()
+            try:
+                user = _detached(
+                    await self._db.find_user_by(session_id=session_id))
+            except NoResultFound:
+                user = None
+            except BaseException:
+                self._sessions.end(token)
+                raise
+            self._sessions.put(session_id, user, token)
+            return user
+        return None
+
+    async def destroy_session(self, user_id: int) -> None:
+        """ Updates an existing session_id to None """
+        if user_id is None:
+            return None
+        await self._db.update_user(user_id, session_id=None)
+        self._sessions.invalidate_user(user_id)
+
+    async def get_reset_password_token(self, email: str) -> str:
+        """ Generates a reset password token, set by email in a single
+        UPDATE statement
+        """
+        reset_token = _generate_uuid()
+        user_ids = await self._db.update_users({"email": email},
+                                               reset_token=reset_token)
+        if not user_ids:
+            raise ValueError()
+        self._sessions.invalidate_user(user_ids[0])
+        return reset_token
+
+    async def update_password(self, reset_token: str, password: str) -> None:
+        """ Finds the user by reset token and updates the hashed_password,
+        checking the token before any bcrypt work
+        """
+        if not reset_token:
+            raise ValueError()
+        try:
+            user = await self._db.find_user_by(reset_token=reset_token)
+        except NoResultFound:
+            raise ValueError()
+        new_password = await self._hasher.hash_async(password)
+        await self._db.update_user(
+            user.id, hashed_password=new_password, reset_token=None)
+        self._sessions.invalidate_user(user.id)
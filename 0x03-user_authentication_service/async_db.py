@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""Async DB module
+"""
+from os import getenv
+from sqlalchemy import event, insert
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm.exc import NoResultFound
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from typing import List, Tuple
+
+from db import _end_query, _engine_options, _find_user_statement, \
+    _start_query, _tune_sqlite, _update_users_statements, _user_rows
+from user import Base, User
+
+
+class AsyncDB:
+    """DB class for asyncio code, with the same queries as DB
+
+    Every method opens its own session, so that concurrent tasks never share
+    one. SQLite is reached through aiosqlite.
+    """
+
+    def __init__(self, url: str = None) -> None:
+        """Initialize a new AsyncDB instance
+
+        The database URL comes from AUTH_DB_URL (default 'sqlite:///a.db').
+        Tables are only created by 'create_all'.
+        """
+        url = make_url(url or getenv("AUTH_DB_URL", "sqlite:///a.db"))
+        if url.drivername == "sqlite":
+            url = url.set(drivername="sqlite+aiosqlite")
+        options = _engine_options(url, AsyncAdaptedQueuePool)
+        self._engine = create_async_engine(url, echo=False, **options)
+        engine = self._engine.sync_engine
+        if url.drivername.startswith("sqlite"):
+            event.listen(engine, "connect", _tune_sqlite)
+        event.listen(engine, "before_cursor_execute", _start_query)
+        event.listen(engine, "after_cursor_execute", _end_query)
+        self._sessions = async_sessionmaker(self._engine,
+                                            expire_on_commit=False)
+
+    async def create_all(self) -> None:
+        """ Creates the missing tables, dropping them all first when
+        AUTH_DB_RESET=1
+        """
+        async with self._engine.begin() as conn:
+            if getenv("AUTH_DB_RESET") == "1":
+                await conn.run_sync(Base.metadata.drop_all)
+            await conn.run_sync(Base.metadata.create_all)
+
+    async def dispose(self) -> None:
+        """ Closes every pooled connection """
+        await self._engine.dispose()
+
+    async def add_user(self, email: str, hashed_password: str) -> User:
+        """ Saves a user to a database """
+        async with self._sessions() as session:
+            try:
+                new_user = User(email=email, hashed_password=hashed_password)
+                session.add(new_user)
+                await session.commit()
+            except Exception:
+                await session.rollback()
+                new_user = None
+        return new_user
+
+    async def add_users(self, users: List[Tuple[str, str]]) -> int:
+        """ Saves many (email, hashed_password) users with one INSERT in a
+        single transaction and returns how many were added
+        """
+        rows = _user_rows(users)
+        if not rows:
+            return 0
+        async with self._sessions() as session:
+            await session.execute(insert(User), rows)
+            await session.commit()
+        return len(rows)
+
+    async def find_user_by(self, **kwargs) -> User:
+        """ Returns the first user matching every argument
+
+        'NoResultFound' and 'InvalidRequestError' are raised when no user
+        matches or when an argument is not a column respectively. A None
+        value matches no user, rather than the users where it is NULL.
+        """
+        statement = _find_user_statement(kwargs)
+        async with self._sessions() as session:
+            row = (await session.scalars(statement)).first()
+        if row is None:
+            raise NoResultFound()
+        return row
+
+    async def update_users(self, where: dict, **kwargs) -> List[int]:
+        """ Updates the users matching every 'where' equality with a single
+        UPDATE statement, commits it and returns the IDs of those users
+
+        Backends without UPDATE ... RETURNING first lock and read the IDs.
+        """
+        select_ids, statement = _update_users_statements(
+            where, kwargs, self._engine.dialect)
+        async with self._sessions() as session:
+            if select_ids is None:
+                user_ids = (await session.execute(statement)).scalars().all()
+            else:
+                user_ids = (await session.scalars(select_ids)).all()
+                if user_ids:
+                    await session.execute(
+                        statement.where(User.id.in_(user_ids)))
+            await session.commit()
+        return user_ids
+
+    async def update_user(self, user_id: int, **kwargs) -> None:
+        """ Updates a user with a single UPDATE by ID
+
+        'ValueError' is raised for an argument that is not a column and
+        'NoResultFound' when no user has that ID.
+        """
+        if not await self.update_users({"id": user_id}, **kwargs):
+            raise NoResultFound()
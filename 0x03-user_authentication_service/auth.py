@@ -1,18 +1,33 @@
 #!/usr/bin/env python3
 """ Authentication script """
-import bcrypt
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+import threading
 import uuid
 from db import DB
+from hashing import HashingBusy, PasswordHasher
+from session_cache import SessionCache
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm.exc import NoResultFound
-from typing import Union
+from typing import List, Tuple, Union
 from user import User
 
 
+_HASHER = PasswordHasher()
+
+
 def _hash_password(password: str) -> bytes:
     """ Generates a salted hash of the input password and returns it """
-    passwrd = password.encode()
-    hashed = bcrypt.hashpw(passwrd, bcrypt.gensalt())
-    return hashed
+    return _HASHER.hash(password)
+
+
+def _detached(user: User) -> User:
+    """ Returns a copy of a user that is bound to no database session, so
+    that it can be cached and shared between requests
+    """
+    return User(id=user.id, email=user.email,
+                hashed_password=user.hashed_password,
+                session_id=user.session_id, reset_token=user.reset_token)
 
 
 def _generate_uuid() -> str:
@@ -25,50 +40,154 @@ class Auth:
     """Auth class to interact with the authentication database.
     """
 
-    def __init__(self):
+    def __init__(self, hasher: PasswordHasher = None,
+                 session_cache: SessionCache = None):
         self._db = DB()
+        self._hasher = hasher or _HASHER
+        self._sessions = session_cache or SessionCache()
+        self._rehasher = ThreadPoolExecutor(max_workers=1,
+                                            thread_name_prefix="rehash")
+        self._rehashing = set()
+        self._rehashing_lock = threading.Lock()
+
+    def release_session(self) -> None:
+        """ Releases the database session of the current thread """
+        self._db.close_session()
+
+    def session_cache_stats(self) -> dict:
+        """ Returns the hit rate and counters of the session cache """
+        return self._sessions.stats()
 
     def register_user(self, email: str, password: str) -> User:
         try:
             self._db.find_user_by(email=email)
         except NoResultFound:
-            hashed = _hash_password(password)
+            hashed = self._hasher.hash(password)
             new_user = self._db.add_user(email, hashed)
             return new_user
         raise ValueError("User {} already exists".format(email))
 
+    def register_users(self, credentials: List[Tuple[str, str]]) -> int:
+        """ Registers many (email, password) users at once
+
+        Passwords are hashed in parallel and the users are inserted in a
+        single transaction. A ValueError naming the emails already taken,
+        or repeated in 'credentials', is raised before any hashing; one is
+        also raised if another registration takes an email meanwhile.
+        """
+        emails = [email for email, _ in credentials]
+        taken = set(self._db.find_emails(emails))
+        taken.update(email for email, n in Counter(emails).items() if n > 1)
+        if taken:
+            raise ValueError("Users {} already exist".format(
+                ", ".join(sorted(taken))))
+        hashes = self._hasher.hash_many(
+            [password for _, password in credentials])
+        try:
+            return self._db.add_users(list(zip(emails, hashes)))
+        except IntegrityError:
+            raise ValueError("Users already exist")
+
     def valid_login(self, email: str, password: str) -> bool:
-        """ Checks whether email and password provided are valid """
+        """ Checks whether email and password provided are valid
+
+        A password hashed with an outdated work factor is re-hashed at the
+        current one in the background once it has been verified.
+        """
         try:
             user = self._db.find_user_by(email=email)
-            if user and bcrypt.checkpw(
-                    password.encode(), user.hashed_password):
+            if user and self._hasher.verify(password, user.hashed_password):
+                self._rehash_later(user, password)
                 return True
         except NoResultFound:
             return False
         return False
 
+    def _rehash_later(self, user: User, password: str) -> None:
+        """ Queues a re-hash of a verified password whose hash has an
+        outdated work factor, at most one per user at a time
+        """
+        if not self._hasher.needs_rehash(user.hashed_password):
+            return
+        with self._rehashing_lock:
+            if user.id in self._rehashing:
+                return
+            self._rehashing.add(user.id)
+        self._rehasher.submit(self._rehash, user.id, password,
+                              user.hashed_password)
+
+    def _rehash(self, user_id: int, password: str,
+                hashed_password: bytes) -> None:
+        """ Replaces an outdated hash, unless the password was changed in
+        the meantime; runs on the re-hash thread
+        """
+        try:
+            new_hash = self._hasher.hash(password)
+            if self._db.update_users({"id": user_id,
+                                      "hashed_password": hashed_password},
+                                     hashed_password=new_hash):
+                self._sessions.invalidate_user(user_id)
+        except HashingBusy:
+            pass
+        finally:
+            self._db.close_session()
+            with self._rehashing_lock:
+                self._rehashing.discard(user_id)
+
     def create_session(self, email: str) -> Union[str, None]:
-        """ Returns a session uuid string """
+        """ Returns a session uuid string
+
+        The session id is set by email in a single UPDATE statement.
+        """
+        usr_session_id = _generate_uuid()
+        user_ids = self._db.update_users({"email": email},
+                                         session_id=usr_session_id)
+        if not user_ids:
+            return None
+        self._sessions.invalidate_user(user_ids[0])
+        return usr_session_id
+
+    def login(self, email: str, password: str) -> Union[str, None]:
+        """ Checks the credentials and returns a new session id, or None if
+        they are invalid
+
+        This reads the user once and updates it once, where valid_login
+        followed by create_session reads it twice. An outdated hash is
+        re-hashed in the background.
+        """
         try:
             user = self._db.find_user_by(email=email)
-            if user:
-                usr_session_id = _generate_uuid()
-                self._db.update_user(user.id, session_id=usr_session_id)
-                return usr_session_id
         except NoResultFound:
             return None
-        return None
+        if not self._hasher.verify(password, user.hashed_password):
+            return None
+        session_id = _generate_uuid()
+        self._db.update_user(user.id, session_id=session_id)
+        self._sessions.invalidate_user(user.id)
+        self._rehash_later(user, password)
+        return session_id
 
     def get_user_from_session_id(self, session_id: str) -> Union[User, None]:
-        """ Retrieves a user using the session id """
+        """ Retrieves a user using the session id
+
+        Lookups, including those of unknown session ids, are answered from
+        the session cache while they are fresh. The user returned is a
+        detached copy.
+        """
         if session_id:
+            user = self._sessions.get(session_id)
+            if user is not SessionCache.MISS:
+                return user
+            token = self._sessions.begin()
             try:
-                user = self._db.find_user_by(session_id=session_id)
-                if user:
-                    return user
+                user = _detached(self._db.find_user_by(session_id=session_id))
             except NoResultFound:
-                return None
+                user = None
+            except BaseException:
+                self._sessions.end(token)
+                raise
+            self._sessions.put(session_id, user, token)
+            return user
         return None
 
     def destroy_session(self, user_id: int) -> None:
@@ -76,22 +195,28 @@ class Auth:
         if user_id is None:
             return None
         self._db.update_user(user_id, session_id=None)
+        self._sessions.invalidate_user(user_id)
 
     def get_reset_password_token(self, email: str) -> str:
-        """ Generates a reset password token """
-        user = None
-        try:
-            user = self._db.find_user_by(email=email)
-        except NoResultFound:
-            user = None
-        if user is None:
-            raise ValueError()
+        """ Generates a reset password token, set by email in a single
+        UPDATE statement
+        """
         reset_token = _generate_uuid()
-        self._db.update_user(user.id, reset_token=reset_token)
+        user_ids = self._db.update_users({"email": email},
+                                         reset_token=reset_token)
+        if not user_ids:
+            raise ValueError()
+        self._sessions.invalidate_user(user_ids[0])
         return reset_token
 
     def update_password(self, reset_token: str, password: str) -> None:
-        """Find's user by  reset token and updates the hashed_password """
+        """Find's user by  reset token and updates the hashed_password
+
+        The token is checked before hashing so that bogus tokens cost no
+        bcrypt work.
+        """
+        if not reset_token:
+            raise ValueError()
         user = None
         try:
             user = self._db.find_user_by(reset_token=reset_token)
@@ -99,6 +224,7 @@ class Auth:
             user = None
         if user is None:
             raise ValueError()
-        new_password = _hash_password(password)
+        new_password = self._hasher.hash(password)
         self._db.update_user(
             user.id, hashed_password=new_password, reset_token=None)
+        self._sessions.invalidate_user(user.id)
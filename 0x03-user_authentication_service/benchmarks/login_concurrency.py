@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+"""
+Login plus profile throughput through the Flask app at growing thread counts
+
+Usage: python3 -m benchmarks.login_concurrency [LOGINS_PER_THREAD]
+"""
+import os
+import sys
+import tempfile
+import threading
+import time
+
+os.environ.setdefault("AUTH_BCRYPT_ROUNDS", "4")
+os.environ.setdefault("AUTH_HASH_QUEUE", "1000")
+root = os.getcwd()
+os.chdir(tempfile.mkdtemp())
+from app import app  # noqa: E402
+
+per_thread = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+users = 64
+setup = app.test_client()
+for i in range(users):
+    setup.post("/users", data={"email": "user{}@example.com".format(i),
+                               "password": "password"})
+
+
+def client(n: int, failures: list) -> None:
+    """ Logs in and reads the profile 'per_thread' times """
+    http = app.test_client()
+    email = "user{}@example.com".format(n % users)
+    for _ in range(per_thread):
+        r = http.post("/sessions",
+                      data={"email": email, "password": "password"})
+        if r.status_code != 200 or http.get("/profile").status_code != 200:
+            failures.append(r.status_code)
+
+
+for threads in (1, 2, 4, 8, 16):
+    failures = []
+    pool = [threading.Thread(target=client, args=(n, failures))
+            for n in range(threads)]
+    start = time.perf_counter()
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    print("{:>3} threads: {:7.1f} logins/sec, {} failures".format(
+        threads, threads * per_thread / elapsed, len(failures)))
+os.chdir(root)
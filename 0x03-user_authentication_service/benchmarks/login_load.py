@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+"""
+Concurrent login throughput with inline bcrypt vs the offloaded hasher
+"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+HashingBusy = __import__('hashing').HashingBusy
+OffloadedHasher = __import__('hashing').OffloadedHasher
+PasswordHasher = __import__('hashing').PasswordHasher
+
+ROUNDS = 10
+CLIENTS = 64
+LOGINS = 256
+
+
+def run(hasher) -> None:
+    """ Fires LOGINS password checks from CLIENTS concurrent threads """
+    hashed = PasswordHasher(ROUNDS).hash("password")
+    counts = {"ok": 0, "busy": 0}
+    lock = threading.Lock()
+
+    def login(_):
+        try:
+            hasher.verify("password", hashed)
+            outcome = "ok"
+        except HashingBusy:
+            outcome = "busy"
+        with lock:
+            counts[outcome] += 1
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=CLIENTS) as clients:
+        list(clients.map(login, range(LOGINS)))
+    elapsed = time.perf_counter() - start
+    print("{:>10}: {:7.1f} logins/sec, {} served, {} rejected with 503"
+          .format(type(hasher).__name__, counts["ok"] / elapsed,
+                  counts["ok"], counts["busy"]))
+
+
+run(PasswordHasher(ROUNDS))
+run(OffloadedHasher(ROUNDS, workers=4, max_queue=16))
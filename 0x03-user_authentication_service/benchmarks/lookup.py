@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+User lookups at scale: row-value IN on unindexed columns vs indexed equality
+
+Usage: python3 -m benchmarks.lookup [USERS]  (default: 100000)
+"""
+import os
+import sys
+import tempfile
+import timeit
+
+from sqlalchemy import insert, text, tuple_
+
+root = os.getcwd()
+os.chdir(tempfile.mkdtemp())
+from db import DB  # noqa: E402
+from user import User  # noqa: E402
+
+count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+db = DB()
+db._session.execute(insert(User), [
+    {"email": "user{}@example.com".format(i), "hashed_password": "x",
+     "session_id": "session-{}".format(i)} for i in range(count)])
+db._session.commit()
+email = "user{}@example.com".format(count - 1)
+session_id = "session-{}".format(count - 1)
+
+
+def legacy_find(**kwargs) -> User:
+    """ The former query: a row-value IN over a tuple of columns """
+    keys = [getattr(User, k) for k in kwargs]
+    return db._session.query(User).filter(
+        tuple_(*keys).in_([tuple(kwargs.values())])).first()
+
+
+def plan(query) -> str:
+    """ Returns SQLite's plan for a query """
+    sql = str(query.statement.compile(compile_kwargs={"literal_binds": True}))
+    rows = db._session.execute(text("EXPLAIN QUERY PLAN " + sql))
+    return "; ".join(row[-1] for row in rows)
+
+
+def run(label: str, find, query) -> None:
+    """ Times email and session lookups and prints the query plan """
+    number = 200
+    for kwargs in ({"email": email}, {"session_id": session_id}):
+        elapsed = timeit.timeit(lambda: find(**kwargs), number=number)
+        print("{:>8} {:>10}: {:9.1f} us/lookup".format(
+            label, list(kwargs)[0], elapsed / number * 1e6))
+    print("{:>8} plan: {}".format(label, plan(query)))
+
+
+with db._engine.begin() as conn:
+    for column in ("email", "session_id", "reset_token"):
+        conn.execute(text("DROP INDEX ix_users_{}".format(column)))
+db._session.expire_all()
+keys = [User.email]
+run("before", legacy_find,
+    db._session.query(User).filter(tuple_(*keys).in_([(email,)])))
+for index in User.__table__.indexes:
+    index.create(db._engine)
+run("after", db.find_user_by,
+    db._session.query(User).filter_by(email=email))
+os.chdir(root)
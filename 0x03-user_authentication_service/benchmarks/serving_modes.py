@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+Session check and login throughput of the flask app against the ASGI app
+
+Each app is started as a local server on a fresh SQLite file, then driven
+by CONCURRENCY concurrent HTTP clients. The client runs on the same machine,
+so the server CPU time per request is also reported: on a machine with few
+cores the client can bound the request rate of both modes.
+
+Usage: python3 -m benchmarks.serving_modes [CONCURRENCY ...]
+       (default: 10 100 1000)
+"""
+import asyncio
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+USERS = 50
+REQUESTS = 2000
+MODES = {
+    "flask": ["-c", "from app import app; "
+              "app.run(port={port}, threaded=True)"],
+    "asgi": ["-m", "uvicorn", "asgi:app", "--port", "{port}",
+             "--log-level", "warning"],
+}
+
+
+def cpu_seconds(pid: int) -> float:
+    """ Returns the CPU time used so far by a process, read from /proc """
+    try:
+        with open("/proc/{}/stat".format(pid)) as f:
+            fields = f.read().rsplit(")", 1)[1].split()
+    except OSError:
+        return float("nan")
+    return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+
+
+def free_port() -> int:
+    """ Returns a TCP port nobody listens on """
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+async def wait_ready(base: str) -> None:
+    """ Waits until the server answers """
+    async with httpx.AsyncClient(base_url=base) as client:
+        for _ in range(200):
+            try:
+                await client.get("/")
+                return
+            except httpx.TransportError:
+                await asyncio.sleep(0.05)
+    raise RuntimeError("server at {} did not start".format(base))
+
+
+async def setup(base: str) -> list:
+    """ Registers 2 * USERS users and returns the session ids of the first
+    USERS, the others being kept for the login runs
+    """
+    sessions = []
+    async with httpx.AsyncClient(base_url=base) as client:
+        for i in range(2 * USERS):
+            form = {"email": "user{}@example.com".format(i),
+                    "password": "password"}
+            await client.post("/users", data=form)
+            if i < USERS:
+                r = await client.post("/sessions", data=form)
+                sessions.append(r.cookies["session_id"])
+    return sessions
+
+
+async def load(base: str, concurrency: int, request) -> tuple:
+    """ Sends REQUESTS requests from 'concurrency' clients and returns the
+    rate, the 50th and 99th percentile latencies and the failures
+    """
+    latencies = []
+    failures = 0
+    todo = iter(range(REQUESTS))
+    limits = httpx.Limits(max_connections=concurrency,
+                          max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base, limits=limits,
+                                 timeout=60) as client:
+        async def worker() -> None:
+            nonlocal failures
+            for n in todo:
+                start = time.perf_counter()
+                try:
+                    r = await request(client, n)
+                    ok = r.status_code == 200
+                except httpx.HTTPError:
+                    ok = False
+                latencies.append(time.perf_counter() - start)
+                failures += not ok
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+    latencies.sort()
+    return (REQUESTS / elapsed, latencies[len(latencies) // 2],
+            latencies[int(len(latencies) * 0.99)], failures)
+
+
+async def bench(mode: str, concurrencies: list) -> None:
+    """ Starts the server of 'mode' and loads it at every concurrency """
+    port = free_port()
+    base = "http://127.0.0.1:{}".format(port)
+    workdir = tempfile.mkdtemp()
+    env = dict(os.environ, PYTHONPATH=os.getcwd(), AUTH_BCRYPT_ROUNDS="4",
+               AUTH_HASH_QUEUE="10000", AUTH_DB_RESET="1",
+               AUTH_DB_URL="sqlite:///{}/bench.db".format(workdir))
+    server = subprocess.Popen(
+        [sys.executable] + [arg.format(port=port) for arg in MODES[mode]],
+        cwd=workdir, env=env, stderr=subprocess.DEVNULL)
+    try:
+        await wait_ready(base)
+        sessions = await setup(base)
+        rng = random.Random(0)
+
+        def profile(client, n):
+            return client.get("/profile", headers={
+                "Cookie": "session_id=" + rng.choice(sessions)})
+
+        def login(client, n):
+            return client.post("/sessions", data={
+                "email": "user{}@example.com".format(USERS + n % USERS),
+                "password": "password"})
+
+        for concurrency in concurrencies:
+            for name, request in (("profile", profile), ("login", login)):
+                cpu = cpu_seconds(server.pid)
+                rate, p50, p99, failures = await load(base, concurrency,
+                                                      request)
+                cpu = (cpu_seconds(server.pid) - cpu) / REQUESTS
+                print("{:>5} {:>7} x{:<5}: {:7.1f} req/s, p50 {:7.1f} ms, "
+                      "p99 {:7.1f} ms, server {:5.2f} ms CPU/req, {} failed"
+                      .format(mode, name, concurrency, rate, p50 * 1e3,
+                              p99 * 1e3, cpu * 1e3, failures))
+    finally:
+        server.terminate()
+        server.wait()
+
+
+concurrencies = [int(n) for n in sys.argv[1:]] or [10, 100, 1000]
+for mode in MODES:
+    asyncio.run(bench(mode, concurrencies))
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Auth and session throughput on a synthetic, seeded set of users
+
+Usage: python3 -m benchmarks.suite [--size N] [--seed S] [--repeat R]
+       (with the repository root on PYTHONPATH, as benchmark.py runs it)
+Prints a JSON object of {metric: {"value": ..., "unit": ...}}. Users are
+stored in a temporary SQLite file, hashed at AUTH_BCRYPT_ROUNDS (default 4)
+so that the flows rather than bcrypt dominate.
+"""
+import argparse
+import itertools
+import json
+import os
+import random
+import shutil
+import tempfile
+
+from benchmark import throughput
+
+WORKDIR = tempfile.mkdtemp()
+os.environ.setdefault("AUTH_BCRYPT_ROUNDS", "4")
+os.environ.setdefault("AUTH_HASH_QUEUE", "1000")
+os.environ["AUTH_DB_URL"] = "sqlite:///{}/bench.db".format(WORKDIR)
+os.environ["AUTH_DB_RESET"] = "1"
+from app import app, AUTH  # noqa: E402
+
+
+def run(size: int, seed: int, repeat: int) -> dict:
+    """ Runs every case and returns the results """
+    rng = random.Random(seed)
+    hashed = AUTH._hasher.hash("password")
+    AUTH._db.add_users([("user{}@example.com".format(i), hashed)
+                        for i in range(size)])
+    emails = ["user{}@example.com".format(i)
+              for i in rng.sample(range(size), min(size, 200))]
+    fresh_emails = ("new{}@example.com".format(n) for n in itertools.count())
+    client = app.test_client()
+
+    def flow(email: str) -> None:
+        client.post("/sessions", data={"email": email,
+                                       "password": "password"})
+        client.get("/profile")
+        client.delete("/sessions")
+
+    results = {
+        "auth.register": {
+            "value": throughput(
+                lambda _: AUTH.register_user(next(fresh_emails), "password"),
+                range(min(size, 100)), repeat),
+            "unit": "users/s"},
+        "auth.login": {
+            "value": throughput(
+                lambda email: AUTH.login(email, "password"), emails, repeat),
+            "unit": "logins/s"},
+    }
+    # Logging in replaced the sessions, so the lookups get fresh ones
+    sessions = [AUTH.create_session(email) for email in emails]
+    results["auth.session_lookup"] = {
+        "value": throughput(AUTH.get_user_from_session_id, sessions, repeat),
+        "unit": "lookups/s"}
+    results["api.login_profile_logout"] = {
+        "value": throughput(flow, emails, repeat),
+        "unit": "flows/s"}
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--size", type=int, default=10000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    try:
+        results = run(args.size, args.seed, args.repeat)
+    finally:
+        shutil.rmtree(WORKDIR)
+    print(json.dumps(results, indent=2))
@@ -1,36 +1,143 @@
 #!/usr/bin/env python3
 """DB module
 """
-from sqlalchemy import create_engine, tuple_
+from os import getenv
+from sqlalchemy import Select, Update, create_engine, event, insert, \
+    select, update
+from sqlalchemy.engine import URL, Dialect, make_url
 from sqlalchemy.exc import InvalidRequestError
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import scoped_session, sessionmaker
 from sqlalchemy.orm.exc import NoResultFound
 from sqlalchemy.orm.session import Session
+from sqlalchemy.pool import QueuePool
+import time
+from typing import List, Optional, Tuple
 
+from metrics import REGISTRY
 from user import Base, User
 
 
+def _tune_sqlite(connection, _) -> None:
+    """ Sets the pragmas of every new SQLite connection """
+    cursor = connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute("PRAGMA busy_timeout=30000")
+    cursor.close()
+
+
+def _start_query(conn, cursor, statement, parameters, context, many) -> None:
+    """ Notes when a statement starts executing """
+    conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+
+def _end_query(conn, cursor, statement, parameters, context, many) -> None:
+    """ Times a finished statement into 'sql_query_seconds' """
+    elapsed = time.perf_counter() - conn.info["query_start"].pop()
+    REGISTRY.observe("sql_query_seconds", elapsed,
+                     statement=statement.split(None, 1)[0].upper())
+
+
+def _user_rows(users: List[Tuple[str, str]]) -> List[dict]:
+    """ Returns the INSERT parameters of (email, hashed_password) users """
+    return [{"email": email, "hashed_password": hashed_password}
+            for email, hashed_password in users]
+
+
+def _find_user_statement(kwargs: dict) -> Select:
+    """ Returns the SELECT of the first user matching every argument
+
+    'InvalidRequestError' is raised for an argument that is not a column.
+    A None value matches no user, rather than the users where that column
+    is NULL, so 'NoResultFound' is raised straight away.
+    """
+    for k, v in kwargs.items():
+        if not hasattr(User, k):
+            raise InvalidRequestError()
+        if v is None:
+            raise NoResultFound()
+    return select(User).filter_by(**kwargs).limit(1)
+
+
+def _update_users_statements(where: dict, kwargs: dict, dialect: Dialect
+                             ) -> Tuple[Optional[Select], Update]:
+    """ Returns the statements updating the users matching every 'where'
+    equality
+
+    On backends with UPDATE ... RETURNING, that is the single statement
+    returning the IDs, and no SELECT. Elsewhere, such as MySQL, the SELECT
+    locks and returns the IDs, and the UPDATE is to be restricted to them.
+    'ValueError' is raised for an argument that is not a column.
+    """
+    columns = User.__table__.columns
+    for k in list(where) + list(kwargs):
+        if k not in columns:
+            raise ValueError()
+    condition = [columns[k] == v for k, v in where.items()]
+    statement = update(User).where(*condition).values(
+        **kwargs).execution_options(synchronize_session=False)
+    if dialect.update_returning:
+        return None, statement.returning(User.id)
+    return select(User.id).where(*condition).with_for_update(), statement
+
+
+def _engine_options(url: URL, poolclass: type) -> dict:
+    """ Returns the engine options for a database URL
+
+    Pools are sized by AUTH_DB_POOL_SIZE and AUTH_DB_POOL_OVERFLOW, except
+    for an in-memory SQLite database: it only lives as long as its
+    connection, so a 'poolclass' pool lends that single connection to one
+    session at a time.
+    """
+    options = {"pool_pre_ping": True}
+    if url.get_backend_name() == "sqlite":
+        options["connect_args"] = {"timeout": 30}
+        if url.database in (None, "", ":memory:") or \
+                url.query.get("mode") == "memory":
+            options.update(poolclass=poolclass, pool_size=1, max_overflow=0)
+            return options
+    options["pool_size"] = int(getenv("AUTH_DB_POOL_SIZE", "10"))
+    options["max_overflow"] = int(getenv("AUTH_DB_POOL_OVERFLOW", "10"))
+    return options
+
+
 class DB:
     """DB class
     """
 
-    def __init__(self) -> None:
+    def __init__(self, url: str = None) -> None:
         """Initialize a new DB instance
+
+        The database URL comes from AUTH_DB_URL (default 'sqlite:///a.db').
+        Tables are created if missing; set AUTH_DB_RESET=1 to drop them
+        first. SQLite connections run in WAL mode so that readers proceed
+        while a writer commits.
         """
-        self._engine = create_engine("sqlite:///a.db", echo=False)
-        Base.metadata.drop_all(self._engine)
+        url = make_url(url or getenv("AUTH_DB_URL", "sqlite:///a.db"))
+        options = _engine_options(url, QueuePool)
+        if url.get_backend_name() == "sqlite":
+            options["connect_args"]["check_same_thread"] = False
+        self._engine = create_engine(url, echo=False, **options)
+        if url.get_backend_name() == "sqlite":
+            event.listen(self._engine, "connect", _tune_sqlite)
+        event.listen(self._engine, "before_cursor_execute", _start_query)
+        event.listen(self._engine, "after_cursor_execute", _end_query)
+        if getenv("AUTH_DB_RESET") == "1":
+            Base.metadata.drop_all(self._engine)
         Base.metadata.create_all(self._engine)
-        self.__session = None
+        self._sessions = scoped_session(sessionmaker(bind=self._engine))
 
     @property
     def _session(self) -> Session:
-        """Memoized session object
+        """Session of the current thread
+        """
+        return self._sessions()
+
+    def close_session(self) -> None:
+        """ Releases the session of the current thread and its connection
         """
-        if self.__session is None:
-            DBSession = sessionmaker(bind=self._engine)
-            self.__session = DBSession()
-        return self.__session
+        self._sessions.remove()
 
     def add_user(self, email: str, hashed_password: str) -> User:
         """ Saves a user to a database """
@@ -43,33 +150,75 @@ class DB:
             new_user = None
         return new_user
 
+    def add_users(self, users: List[Tuple[str, str]]) -> int:
+        """ Saves many (email, hashed_password) users with one INSERT in a
+        single transaction and returns how many were added
+        """
+        rows = _user_rows(users)
+        if not rows:
+            return 0
+        try:
+            self._session.execute(insert(User), rows)
+            self._session.commit()
+        except Exception:
+            self._session.rollback()
+            raise
+        return len(rows)
+
     def find_user_by(self, **kwargs) -> User:
         """ Returns the first row in the 'users' table as filtered by the
         input arguments.
 
         The 'NoResultFound' and 'InvalidRequestError' are raised when no
         results are found or when wrong query arguments are passed respectively
+
+        Each argument becomes a plain equality filter, so lookups on the
+        indexed columns are index seeks, and SQLAlchemy reuses the compiled
+        statement for every call with the same argument names. A None value
+        matches no user, rather than the users where that column is NULL.
         """
-        keys = []
-        values = []
-        i = 0
-        for k, v in kwargs.items():
-            if not hasattr(User, k):
-                raise InvalidRequestError()
-            keys.append(getattr(User, k))
-            values.append(v)
-        row = self._session.query(User).filter(tuple_(*keys).in_(
-            [tuple(values)])).first()
+        row = self._session.scalars(_find_user_statement(kwargs)).first()
 
         if row is None:
             raise NoResultFound()
 
         return row
 
+    def find_emails(self, emails: List[str]) -> List[str]:
+        """ Returns which of 'emails' already belong to a user """
+        found = []
+        for start in range(0, len(emails), 500):
+            found.extend(self._session.scalars(select(User.email).where(
+                User.email.in_(emails[start:start + 500]))))
+        return found
+
+    def update_users(self, where: dict, **kwargs) -> List[int]:
+        """ Updates the users matching every 'where' equality with a single
+        UPDATE statement, commits it and returns the IDs of those users
+
+        Backends without UPDATE ... RETURNING first lock and read the IDs.
+        """
+        select_ids, statement = _update_users_statements(
+            where, kwargs, self._engine.dialect)
+        try:
+            if select_ids is None:
+                user_ids = self._session.execute(statement).scalars().all()
+            else:
+                user_ids = self._session.scalars(select_ids).all()
+                if user_ids:
+                    self._session.execute(
+                        statement.where(User.id.in_(user_ids)))
+            self._session.commit()
+        except Exception:
+            self._session.rollback()
+            raise
+        return user_ids
+
     def update_user(self, user_id: int, **kwargs) -> None:
-        """ Updates a User object """
-        user = self.find_user_by(id=user_id)
-        for k, v in kwargs.items():
-            if not hasattr(User, k):
-                raise ValueError()
-            user.k = v
+        """ Updates a User object with a single UPDATE by ID
+
+        'ValueError' is raised for an argument that is not a column and
+        'NoResultFound' when no user has that ID.
+        """
+        if not self.update_users({"id": user_id}, **kwargs):
+            raise NoResultFound()
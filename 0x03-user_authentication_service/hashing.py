@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+""" Password hashing service with a configurable bcrypt work factor """
+import argparse
+import asyncio
+import bcrypt
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from os import getenv
+import threading
+import time
+from typing import List
+
+from metrics import timed
+
+
+BCRYPT_ROUNDS = int(getenv("AUTH_BCRYPT_ROUNDS", "12"))
+
+
+def hash_rounds(hashed_password: bytes) -> int:
+    """ Returns the work factor a bcrypt hash was made with """
+    return int(hashed_password.split(b"$")[2])
+
+
+def calibrate_rounds(target: float = 0.25, min_rounds: int = 4,
+                     max_rounds: int = 16) -> int:
+    """ Returns the highest work factor whose hash takes at most 'target'
+    seconds on this machine, and never less than 'min_rounds'
+    """
+    best = min_rounds
+    for rounds in range(min_rounds, max_rounds + 1):
+        start = time.perf_counter()
+        bcrypt.hashpw(b"calibration", bcrypt.gensalt(rounds))
+        if time.perf_counter() - start > target:
+            break
+        best = rounds
+    return best
+
+
+class PasswordHasher:
+    """ Hashes and verifies passwords at a target work factor
+    """
+
+    def __init__(self, rounds: int = None):
+        self.rounds = rounds or BCRYPT_ROUNDS
+
+    @timed("bcrypt_seconds", op="hash")
+    def hash(self, password: str) -> bytes:
+        """ Generates a salted hash of the input password and returns it """
+        return bcrypt.hashpw(password.encode(), bcrypt.gensalt(self.rounds))
+
+    @timed("bcrypt_seconds", op="verify")
+    def verify(self, password: str, hashed_password: bytes) -> bool:
+        """ Checks a password against its hash """
+        return bcrypt.checkpw(password.encode(), hashed_password)
+
+    def hash_many(self, passwords: List[str],
+                  workers: int = None) -> List[bytes]:
+        """ Hashes many passwords in parallel, bcrypt releasing the GIL,
+        and returns the hashes in the same order
+        """
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            return list(pool.map(self.hash, passwords))
+
+    def needs_rehash(self, hashed_password: bytes) -> bool:
+        """ Checks whether a hash was made with another work factor """
+        return hash_rounds(hashed_password) != self.rounds
+
+
+class HashingBusy(Exception):
+    """ Raised when the hashing pool has no room for another job """
+
+
+class OffloadedHasher(PasswordHasher):
+    """ PasswordHasher that runs bcrypt on a bounded thread pool
+
+    At most 'workers' hashes run at once and at most 'max_queue' more wait
+    for a worker. Beyond that, hash and verify raise HashingBusy straight
+    away so callers can shed load instead of piling up requests.
+    """
+
+    def __init__(self, rounds: int = None, workers: int = None,
+                 max_queue: int = None):
+        super().__init__(rounds)
+        self.workers = workers or int(getenv("AUTH_HASH_WORKERS", "4"))
+        self.max_queue = max_queue if max_queue is not None else \
+            int(getenv("AUTH_HASH_QUEUE", "16"))
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.workers, thread_name_prefix="bcrypt")
+        self._slots = threading.BoundedSemaphore(
+            self.workers + self.max_queue)
+
+    def _submit(self, func, *args) -> Future:
+        """ Queues 'func' on the pool and returns its future """
+        if not self._slots.acquire(blocking=False):
+            raise HashingBusy("Hashing queue is full")
+        try:
+            future = self._executor.submit(func, *args)
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return future
+
+    def _run(self, func, *args):
+        """ Runs 'func' on the pool and waits for its result """
+        return self._submit(func, *args).result()
+
+    def hash(self, password: str) -> bytes:
+        """ Hashes the password on the pool """
+        return self._run(super().hash, password)
+
+    def verify(self, password: str, hashed_password: bytes) -> bool:
+        """ Checks the password on the pool """
+        return self._run(super().verify, password, hashed_password)
+
+    def hash_many(self, passwords: List[str],
+                  workers: int = None) -> List[bytes]:
+        """ Hashes many passwords on the pool and returns the hashes in the
+        same order
+
+        At most 'workers' (the pool size when None) of them are queued at
+        once, so a batch never takes the queue slots of other requests.
+        """
+        window = workers or self.workers
+        pending = deque()
+        hashes = []
+        for password in passwords:
+            if len(pending) >= window:
+                hashes.append(pending.popleft().result())
+            pending.append(self._submit(super().hash, password))
+        hashes.extend(future.result() for future in pending)
+        return hashes
+
+    async def hash_async(self, password: str) -> bytes:
+        """ Hashes the password on the pool without blocking the event
+        loop
+        """
+        return await asyncio.wrap_future(
+            self._submit(PasswordHasher.hash, self, password))
+
+    async def verify_async(self, password: str,
+                           hashed_password: bytes) -> bool:
+        """ Checks the password on the pool without blocking the event
+        loop
+        """
+        return await asyncio.wrap_future(self._submit(
+            PasswordHasher.verify, self, password, hashed_password))
+
+    def shutdown(self) -> None:
+        """ Waits for running jobs and stops the pool """
+        self._executor.shutdown(wait=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Pick the bcrypt work factor for a target hash latency")
+    parser.add_argument("--target-ms", type=float, default=250,
+                        help="target milliseconds per hash")
+    args = parser.parse_args()
+    print(calibrate_rounds(args.target_ms / 1000))
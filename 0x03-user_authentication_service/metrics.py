@@ -0,0 +1,14 @@
+#!/usr/bin/env python3
+""" Metrics of the auth service
+
+The code is shared with the Basic auth API in request_metrics.py, at the
+repository root.
+"""
+from os import path
+import sys
+
+sys.path.append(path.dirname(path.dirname(path.abspath(__file__))))
+from request_metrics import (REGISTRY, Registry, instrument_app,  # noqa: E402
+                             timed)
+
+__all__ = ["REGISTRY", "Registry", "instrument_app", "timed"]
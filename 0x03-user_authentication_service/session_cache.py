@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+""" Bounded LRU/TTL cache of session lookups """
+from collections import Counter, OrderedDict
+from os import getenv
+import threading
+import time
+from typing import Any, Dict
+
+
+class SessionCache:
+    """ Maps session IDs to users, or to None for unknown session IDs
+
+    Entries expire after 'ttl' seconds, or 'negative_ttl' seconds for
+    unknown session IDs, and the least recently used entry is evicted once
+    'maxsize' entries are held.
+
+    A database read meant to fill the cache starts with 'begin', and its
+    result is passed to 'put' with the token it returned. If the user was
+    invalidated while the read was in flight, 'put' drops the result, so a
+    stale session is never cached again.
+    """
+
+    MISS = object()
+
+    def __init__(self, maxsize: int = None, ttl: float = None,
+                 negative_ttl: float = None):
+        self.maxsize = maxsize or int(getenv("AUTH_SESSION_CACHE_SIZE",
+                                             "10000"))
+        self.ttl = ttl if ttl is not None else \
+            float(getenv("AUTH_SESSION_CACHE_TTL", "60"))
+        self.negative_ttl = negative_ttl if negative_ttl is not None else \
+            float(getenv("AUTH_SESSION_CACHE_NEGATIVE_TTL", "5"))
+        self._entries = OrderedDict()
+        self._by_user = {}
+        self._lock = threading.Lock()
+        self._generation = 0
+        self._reads = Counter()
+        self._invalidated = {}
+        self._counts = {"hits": 0, "negative_hits": 0, "misses": 0,
+                        "evictions": 0, "invalidations": 0}
+
+    def get(self, session_id: str) -> Any:
+        """ Returns the cached user, None for a known bogus session ID, or
+        SessionCache.MISS when the database has to be asked
+        """
+        with self._lock:
+            entry = self._entries.get(session_id)
+            if entry is None or entry[0] <= time.monotonic():
+                if entry is not None:
+                    self._drop(session_id)
+                self._counts["misses"] += 1
+                return self.MISS
+            self._entries.move_to_end(session_id)
+            self._counts["hits" if entry[1] else "negative_hits"] += 1
+            return entry[1]
+
+    def begin(self) -> int:
+        """ Starts a database read whose result will be given to 'put' and
+        returns its token
+        """
+        with self._lock:
+            self._reads[self._generation] += 1
+            return self._generation
+
+    def end(self, token: int) -> None:
+        """ Ends a read started with 'begin' whose result is not cached """
+        with self._lock:
+            self._end(token)
+
+    def put(self, session_id: str, user: Any, token: int = None) -> None:
+        """ Caches the user of a session ID, or None if there is none
+
+        With the token of the read that found 'user', nothing is cached if
+        that user was invalidated since the read began.
+        """
+        ttl = self.ttl if user is not None else self.negative_ttl
+        with self._lock:
+            if token is not None:
+                stale = user is not None and \
+                    self._invalidated.get(user.id, -1) >= token
+                self._end(token)
+                if stale:
+                    return
+            self._drop(session_id)
+            self._entries[session_id] = (time.monotonic() + ttl, user)
+            if user is not None:
+                self._by_user[user.id] = session_id
+            while len(self._entries) > self.maxsize:
+                self._drop(next(iter(self._entries)))
+                self._counts["evictions"] += 1
+
+    def invalidate(self, session_id: str) -> None:
+        """ Forgets a session ID """
+        with self._lock:
+            if self._drop(session_id):
+                self._counts["invalidations"] += 1
+
+    def invalidate_user(self, user_id: int) -> None:
+        """ Forgets the cached session of a user """
+        with self._lock:
+            if self._reads:
+                self._invalidated[user_id] = self._generation
+                self._generation += 1
+            session_id = self._by_user.get(user_id)
+            if session_id is not None and self._drop(session_id):
+                self._counts["invalidations"] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        """ Returns the hit, miss, eviction and invalidation counts, the
+        hit rate and the current size
+        """
+        with self._lock:
+            stats = dict(self._counts)
+            stats["size"] = len(self._entries)
+        lookups = stats["hits"] + stats["negative_hits"] + stats["misses"]
+        stats["hit_rate"] = (stats["hits"] + stats["negative_hits"]) / \
+            lookups if lookups else 0.0
+        return stats
+
+    def _end(self, token: int) -> None:
+        """ Closes a read, the lock being held; invalidations can be
+        forgotten once no read is in flight
+        """
+        self._reads[token] -= 1
+        if self._reads[token] <= 0:
+            del self._reads[token]
+        if not self._reads:
+            self._invalidated.clear()
+
+    def _drop(self, session_id: str) -> bool:
+        """ Removes an entry, the lock being held """
+        entry = self._entries.pop(session_id, None)
+        if entry is None:
+            return False
+        user = entry[1]
+        if user is not None and self._by_user.get(user.id) == session_id:
+            del self._by_user[user.id]
+        return True
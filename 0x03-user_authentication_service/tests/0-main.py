@@ -0,0 +1,33 @@
+#!/usr/bin/env python3
+"""
+Main file: a missing reset token or session id matches no user
+"""
+import os
+import tempfile
+
+os.environ["AUTH_DB_URL"] = "sqlite:///{}/a.db".format(tempfile.mkdtemp())
+os.environ["AUTH_BCRYPT_ROUNDS"] = "4"
+
+Auth = __import__('auth').Auth
+NoResultFound = __import__('db').NoResultFound
+
+auth = Auth()
+victim = auth.register_user("victim@example.com", "secret")
+
+for value in ("reset_token", "session_id"):
+    try:
+        auth._db.find_user_by(**{value: None})
+        print("{}=None found a user".format(value))
+    except NoResultFound:
+        print("{}=None: no user".format(value))
+
+for token in (None, ""):
+    try:
+        auth.update_password(token, "hijacked")
+        print("password reset with {!r}".format(token))
+    except ValueError:
+        print("rejected {!r}".format(token))
+
+print(auth.valid_login("victim@example.com", "secret"))
+print(auth.valid_login("victim@example.com", "hijacked"))
+print(auth.get_user_from_session_id(None))
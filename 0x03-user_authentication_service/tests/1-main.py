@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+"""
+Main file: session cache tokens and negative caching
+"""
+import time
+
+SessionCache = __import__('session_cache').SessionCache
+
+
+class User:
+    """ Minimal cached user """
+
+    def __init__(self, id):
+        self.id = id
+
+
+cache = SessionCache(ttl=60, negative_ttl=0.2)
+
+# A logout lands between the database read and the put
+token = cache.begin()
+cache.invalidate_user(1)
+cache.put("stale", User(1), token)
+print(cache.get("stale") is SessionCache.MISS)
+
+# Another user's logout does not stop the put
+token = cache.begin()
+cache.invalidate_user(2)
+cache.put("fresh", User(1), token)
+print(cache.get("fresh").id)
+
+# Two overlapping reads, the invalidation after the first began
+first = cache.begin()
+cache.invalidate_user(3)
+second = cache.begin()
+cache.put("old", User(3), first)
+cache.put("new", User(3), second)
+print(cache.get("old") is SessionCache.MISS, cache.get("new").id)
+
+# A bogus session ID is answered from the cache until negative_ttl runs out
+cache.put("bogus", None, cache.begin())
+print(cache.get("bogus"), cache.stats()["negative_hits"])
+time.sleep(0.25)
+print(cache.get("bogus") is SessionCache.MISS)
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Runs the benchmark suite of every project and compares results
+
+Usage:
+    python3 benchmark.py run [--size N] [--seed S] [--repeat R] [-o FILE]
+    python3 benchmark.py compare BASELINE CURRENT [--threshold 0.1]
+
+'run' starts each project's 'benchmarks.suite' in its own process, from a
+temporary directory, and writes all metrics with the run settings to one
+JSON file. The repository root is also put on PYTHONPATH, so that the
+suites share 'throughput'. Every metric is a rate, so higher is better.
+'compare' exits with status 1 when a metric of CURRENT is slower than
+BASELINE by more than the threshold, or when a metric of BASELINE is
+missing from CURRENT.
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Callable, List
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+PROJECTS = ("0x00-personal_data", "0x01-Basic_authentication",
+            "0x03-user_authentication_service")
+
+
+def throughput(func: Callable, items: List, repeat: int) -> float:
+    """ Best rate, in items per second, of 'func' over all 'items' """
+    best = 0.0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for item in items:
+            func(item)
+        best = max(best, len(items) / (time.perf_counter() - start))
+    return best
+
+
+def run(size: int, seed: int, repeat: int, output: str) -> None:
+    """ Runs every project suite and writes the results to 'output' """
+    metrics = {}
+    for project in PROJECTS:
+        env = dict(os.environ, PYTHONPATH=os.pathsep.join(
+            (os.path.join(ROOT, project), ROOT)))
+        with tempfile.TemporaryDirectory() as workdir:
+            out = subprocess.run(
+                [sys.executable, "-m", "benchmarks.suite", "--size",
+                 str(size), "--seed", str(seed), "--repeat", str(repeat)],
+                cwd=workdir, env=env, stdout=subprocess.PIPE, check=True)
+        for name, result in json.loads(out.stdout).items():
+            metrics[name] = result
+            print("{:<32} {:>14.1f} {}".format(
+                name, result["value"], result["unit"]), file=sys.stderr)
+    results = {"settings": {"size": size, "seed": seed, "repeat": repeat},
+               "python": platform.python_version(),
+               "machine": platform.platform(),
+               "cpus": os.cpu_count(),
+               "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+               "metrics": metrics}
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2)
+
+
+def compare(baseline: str, current: str, threshold: float) -> List[str]:
+    """ Prints every metric change and returns the regressed metrics,
+    counting a metric of 'baseline' missing from 'current' as regressed
+    """
+    with open(baseline) as f:
+        before = json.load(f)
+    with open(current) as f:
+        after = json.load(f)
+    if before["settings"] != after["settings"]:
+        print("warning: runs used different settings {} and {}".format(
+            before["settings"], after["settings"]), file=sys.stderr)
+    regressions = []
+    for name, result in sorted(before["metrics"].items()):
+        if name not in after["metrics"]:
+            regressions.append(name)
+            print("{:<32} missing  REGRESSION".format(name))
+            continue
+        change = after["metrics"][name]["value"] / result["value"] - 1
+        regressed = change < -threshold
+        if regressed:
+            regressions.append(name)
+        print("{:<32} {:>14.1f} -> {:>14.1f} {:+7.1%}{}".format(
+            name, result["value"], after["metrics"][name]["value"], change,
+            "  REGRESSION" if regressed else ""))
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    commands = parser.add_subparsers(dest="command", required=True)
+    run_parser = commands.add_parser("run", help="run every suite")
+    run_parser.add_argument("--size", type=int, default=10000,
+                            help="number of synthetic users or messages")
+    run_parser.add_argument("--seed", type=int, default=0)
+    run_parser.add_argument("--repeat", type=int, default=3,
+                            help="rounds per case, the best one is kept")
+    run_parser.add_argument("-o", "--output", default="benchmark.json")
+    compare_parser = commands.add_parser("compare",
+                                         help="compare two result files")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("current")
+    compare_parser.add_argument("--threshold", type=float, default=0.1,
+                                help="largest accepted slowdown (0.1: 10%%)")
+    args = parser.parse_args()
+    if args.command == "run":
+        run(args.size, args.seed, args.repeat, args.output)
+    elif compare(args.baseline, args.current, args.threshold):
+        sys.exit(1)
@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+""" Request and hot-path timing as Prometheus metrics, and a request
+stack sampler, shared by the Flask apps of the repository
+"""
+from bisect import bisect_left
+from collections import Counter, deque
+from functools import wraps
+from os import getenv
+import sys
+import threading
+import time
+from typing import Callable, Dict, Tuple
+
+
+BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025,
+           0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+
+class Histogram:
+    """ Counts of observations per bucket, plus their sum """
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+
+class Registry:
+    """ In-process store of histograms, gauges and request profiles """
+
+    def __init__(self):
+        self._histograms = {}
+        self._gauges = {}
+        self._lock = threading.Lock()
+        self.profiles = deque(maxlen=10)
+
+    def observe(self, name: str, value: float, **labels: str) -> None:
+        """ Records one observation of the histogram 'name' """
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram()
+            histogram.counts[bisect_left(BUCKETS, value)] += 1
+            histogram.sum += value
+            histogram.count += 1
+
+    def gauge(self, name: str, read: Callable[[], float]) -> None:
+        """ Registers a gauge read when the metrics are rendered """
+        self._gauges[name] = read
+
+    def timed(self, name: str, **labels: str) -> Callable:
+        """ Decorator timing every call into the histogram 'name' """
+        def decorator(func: Callable) -> Callable:
+            @wraps(func)
+            def wrapper(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return func(*args, **kwargs)
+                finally:
+                    self.observe(name, time.perf_counter() - start,
+                                 **labels)
+            return wrapper
+        return decorator
+
+    def render(self) -> str:
+        """ Returns every metric in the Prometheus text format """
+        with self._lock:
+            histograms = [(key, list(h.counts), h.sum, h.count)
+                          for key, h in sorted(self._histograms.items())]
+        lines = []
+        typed = set()
+        for (name, labels), counts, total, count in histograms:
+            if name not in typed:
+                lines.append("# TYPE {} histogram".format(name))
+                typed.add(name)
+            cumulative = 0
+            for bound, n in zip(BUCKETS + ("+Inf",), counts):
+                cumulative += n
+                lines.append("{}_bucket{} {}".format(
+                    name, _labels(labels + (("le", str(bound)),)),
+                    cumulative))
+            lines.append("{}_sum{} {}".format(name, _labels(labels), total))
+            lines.append("{}_count{} {}".format(name, _labels(labels),
+                                                count))
+        for name, read in sorted(self._gauges.items()):
+            lines.append("# TYPE {} gauge".format(name))
+            lines.append("{} {}".format(name, read()))
+        return "\n".join(lines) + "\n"
+
+
+def _labels(labels: Tuple[Tuple[str, str], ...]) -> str:
+    """ Formats label pairs as {k="v",...} """
+    if not labels:
+        return ""
+    return "{" + ",".join('{}="{}"'.format(
+        k, str(v).replace("\\", "\\\\").replace('"', '\\"'))
+        for k, v in labels) + "}"
+
+
+class Sampler:
+    """ Samples the stack of one thread at a fixed interval """
+
+    def __init__(self, thread_id: int, interval: float = 0.001):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self) -> None:
+        """ Starts sampling """
+        self._thread.start()
+
+    def stop(self) -> Dict[str, int]:
+        """ Stops sampling and returns the folded stack counts """
+        self._stop.set()
+        self._thread.join()
+        return dict(self.stacks)
+
+    def _run(self) -> None:
+        """ Records the target thread's stack until stopped """
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append("{}:{}".format(code.co_filename.rsplit(
+                    "/", 1)[-1], code.co_name))
+                frame = frame.f_back
+            if stack:
+                self.stacks[";".join(reversed(stack))] += 1
+
+
+REGISTRY = Registry()
+timed = REGISTRY.timed
+
+
+def instrument_app(app, registry: Registry = REGISTRY,
+                   authorize: Callable[[], bool] = None) -> None:
+    """ Times every request of a Flask app and serves GET /metrics
+
+    When METRICS_PROFILING=1, a request sent with the header 'X-Profile: 1'
+    is also sampled by a stack profiler. Its folded stacks are kept and
+    served at GET /metrics/profile, with 403 when 'authorize' is given and
+    returns False for the request.
+    """
+    from flask import abort, g, request
+
+    profiling = getenv("METRICS_PROFILING") == "1"
+
+    @app.before_request
+    def start_timer() -> None:
+        g.metrics_start = time.perf_counter()
+        if profiling and request.headers.get("X-Profile") == "1":
+            g.metrics_sampler = Sampler(threading.get_ident())
+            g.metrics_sampler.start()
+
+    @app.after_request
+    def record_request(response):
+        start = g.pop("metrics_start", None)
+        if start is not None:
+            registry.observe("http_request_duration_seconds",
+                             time.perf_counter() - start,
+                             method=request.method,
+                             endpoint=request.endpoint or "unknown",
+                             status=str(response.status_code))
+        sampler = g.pop("metrics_sampler", None)
+        if sampler is not None:
+            stacks = sampler.stop()
+            registry.profiles.append((request.path, stacks))
+            response.headers["X-Profile-Samples"] = str(sum(stacks.values()))
+        return response
+
+    def metrics() -> str:
+        return app.response_class(registry.render(),
+                                  mimetype="text/plain; version=0.0.4")
+
+    def profile() -> str:
+        if authorize is not None and not authorize():
+            abort(403)
+        lines = []
+        for path, stacks in registry.profiles:
+            lines.append("# {}".format(path))
+            lines.extend("{} {}".format(stack, n) for stack, n in sorted(
+                stacks.items(), key=lambda item: -item[1]))
+        return app.response_class("\n".join(lines) + "\n",
+                                  mimetype="text/plain")
+
+    app.add_url_rule("/metrics", "metrics", metrics)
+    app.add_url_rule("/metrics/profile", "metrics_profile", profile)